@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+# 
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from NacaCurves import create4DigitNacaAerofoil
+from SplineAlgorithms import bernsteinFunctions
+from SplineAlgorithms import findSpan
+from SplineAlgorithms import findSpans
+from SplineAlgorithms import splineBasisFunctions
+from SplineAlgorithms import bandedSplineBasisFunctions
+from SplineFitting import fitSplineCurve
+from SplineFitting import CurveProjector
+
+def main():
+    parser = argparse.ArgumentParser(description = "Times the spline and aerofoil hot paths.")
+    parser.add_argument("--output", help = "File to write the JSON results to. Defaults to stdout.")
+    parser.add_argument("--baseline", help = "JSON results from an earlier run to compare against.")
+    parser.add_argument("--threshold", type = float, default = 0.25,
+                        help = "Allowed fractional slow down before a case counts as a regression.")
+    parser.add_argument("--memory-threshold", type = float, default = 0.10,
+                        help = "Allowed fractional growth in peak memory before a case counts as a regression.")
+    parser.add_argument("--filter", default = "*", help = "Only run cases whose name matches this glob.")
+    parser.add_argument("--repeats", type = int, default = 5, help = "Timings per case; the fastest is kept.")
+    parser.add_argument("--quick", action = "store_true", help = "Only run the smallest sizes.")
+    arguments = parser.parse_args()
+
+    results = runBenchmarks(createCases(arguments.quick), arguments.filter, arguments.repeats)
+
+    text = json.dumps({ "numpy" : np.__version__, "cases" : results }, indent = 2)
+    if arguments.output is None:
+        print(text)
+    else:
+        with open(arguments.output, "w") as file:
+            file.write(text)
+
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)["cases"]
+        regressions = compareWithBaseline(results, baseline, arguments.threshold, arguments.memory_threshold)
+        for regression in regressions:
+            print(regression, file = sys.stderr)
+        exit(len(regressions) > 0)
+
+def createCases(quick):
+    """Returns a list of (name, parameters, setup) for every benchmark case. setup is
+    called untimed and returns the function to time."""
+
+    numParametersSweep = (1000,) if quick else (1000, 10000, 100000)
+    numPointsSweep = (10000,) if quick else (10000, 100000, 1000000)
+    numKnotsSweep = (10,) if quick else (10, 100, 1000)
+    degreeSweep = (2, 3) if quick else (2, 3, 4)
+
+    cases = []
+    for numParameters, numKnots, degree in itertools.product(numParametersSweep, numKnotsSweep, degreeSweep):
+        parameters = { "numParameters" : numParameters, "numKnots" : numKnots, "degree" : degree }
+        cases.append(("findSpan", parameters, _setupFindSpan))
+        cases.append(("findSpans", parameters, _setupFindSpans))
+        cases.append(("bandedSplineBasisFunctions", parameters, _setupBandedBasis))
+        if numParameters * numKnots <= 10**7:
+            cases.append(("splineBasisFunctions", parameters, _setupDenseBasis))
+
+    for numParameters, degree in itertools.product(numParametersSweep, degreeSweep + (6,)):
+        cases.append(("bernsteinFunctions", { "numParameters" : numParameters, "degree" : degree },
+                      _setupBernstein))
+
+    for numParameters in numParametersSweep:
+        cases.append(("create4DigitNacaAerofoil", { "numParameters" : numParameters }, _setupNaca))
+
+    for numPoints in numPointsSweep:
+        cases.append(("CurveProjector.project", { "numPoints" : numPoints }, _setupProjector))
+
+    return cases
+
+def runBenchmarks(cases, pattern, repeats):
+    """Runs each case matching pattern, recording its fastest time and its peak traced memory."""
+
+    results = []
+    for name, parameters, setup in cases:
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+
+        function = setup(**parameters)
+        function()
+
+        timings = []
+        for repeat in range(0, repeats):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        function()
+        peakBytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results.append({ "name" : name,
+                         "parameters" : parameters,
+                         "seconds" : min(timings),
+                         "peakBytes" : peakBytes })
+        print("{:30} {:60} {:10.6f}s {:12d}B".format(name, json.dumps(parameters), min(timings), peakBytes),
+              file = sys.stderr)
+
+    return results
+
+def compareWithBaseline(results, baseline, threshold, memoryThreshold):
+    """Returns a description of every case that is slower, or uses more memory, than its
+    baseline by more than the given fractions. Cases missing from the baseline are ignored."""
+
+    baselineCases = { _caseKey(case) : case for case in baseline }
+
+    regressions = []
+    for case in results:
+        reference = baselineCases.get(_caseKey(case))
+        if reference is None:
+            continue
+
+        if case["seconds"] > reference["seconds"] * (1 + threshold):
+            regressions.append("{} {}: {:.6f}s, baseline {:.6f}s".format(
+                case["name"], json.dumps(case["parameters"]), case["seconds"], reference["seconds"]))
+        if case["peakBytes"] > reference["peakBytes"] * (1 + memoryThreshold):
+            regressions.append("{} {}: {}B peak, baseline {}B".format(
+                case["name"], json.dumps(case["parameters"]), case["peakBytes"], reference["peakBytes"]))
+
+    return regressions
+
+def _caseKey(case):
+    return (case["name"], json.dumps(case["parameters"], sort_keys = True))
+
+def _createKnotVector(numKnots, degree):
+    internalKnots = np.sort(np.random.default_rng(0).random(max(numKnots - 2*degree, 0)))
+    return np.concatenate((np.zeros(degree), internalKnots, np.ones(degree)))
+
+def _createParameters(numParameters):
+    return np.random.default_rng(1).random(numParameters)
+
+def _setupFindSpan(numParameters, numKnots, degree):
+    knotVector = _createKnotVector(numKnots, degree)
+    parameters = _createParameters(numParameters)
+    return lambda: [findSpan(degree, u, knotVector) for u in parameters]
+
+def _setupFindSpans(numParameters, numKnots, degree):
+    knotVector = _createKnotVector(numKnots, degree)
+    parameters = _createParameters(numParameters)
+    return lambda: findSpans(degree, parameters, knotVector)
+
+def _setupBandedBasis(numParameters, numKnots, degree):
+    knotVector = _createKnotVector(numKnots, degree)
+    parameters = _createParameters(numParameters)
+    return lambda: bandedSplineBasisFunctions(parameters, degree, knotVector)
+
+def _setupDenseBasis(numParameters, numKnots, degree):
+    knotVector = _createKnotVector(numKnots, degree)
+    parameters = _createParameters(numParameters)
+    return lambda: splineBasisFunctions(parameters, degree, knotVector)
+
+def _setupBernstein(numParameters, degree):
+    parameters = _createParameters(numParameters)
+    return lambda: bernsteinFunctions(parameters, degree)
+
+def _setupNaca(numParameters):
+    x = (1 - np.cos(np.linspace(0, np.pi, numParameters)))/2
+    return lambda: create4DigitNacaAerofoil(4, 4, 12, x, assumeSorted = True)
+
+def _setupProjector(numPoints):
+    x = (1 - np.cos(np.linspace(0, np.pi, 201)))/2
+    curve = fitSplineCurve(create4DigitNacaAerofoil(4, 4, 12, x)['anticlockwise'], 4, 30)['curve']
+    # Points scattered around the aerofoil, as from a measured surface.
+    noise = np.random.default_rng(2).normal(scale = 0.01, size = (numPoints, 2))
+    points = curve.evaluate(_createParameters(numPoints)) + noise
+    projector = CurveProjector(curve)
+    return lambda: projector.project(points)
+
+if __name__ == "__main__":
+    main()
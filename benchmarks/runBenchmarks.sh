@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+
+echo "$0" >&2
+thisdir=`dirname $0`
+python3 $thisdir/runBenchmarks.py "$@"
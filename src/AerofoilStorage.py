@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+# 
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import struct
+
+import numpy as np
+
+_magic = b'NACABIN1'
+_alignment = 64
+_dtype = np.dtype('<f8')
+
+def writeAerofoil(fileName, aerofoil, digits, sampling, curve = None):
+    """Writes an aerofoil, and optionally a spline fitted to it, to a binary file that
+    readAerofoil can memory map.
+
+    Inputs
+    ------
+    fileName : The file to write
+    aerofoil : A dictionary of arrays, such as returned by create4DigitNacaAerofoil or
+               create4DigitNacaFamily. Every array in it is written.
+    digits : The NACA digits, e.g. (4, 4, 12)
+    sampling : A description of how the x values were chosen, e.g. 'cosine'
+    curve : Optional. A fitted BSplineCurve, whose degree and knot vector are stored in
+            the header and whose control points are written as the 'controlPoints' array.
+
+    Notes
+    -----
+    The file is a fixed magic string, the header length as a little endian uint64, a JSON
+    header, and then each array as raw little endian float64 values. The header and every
+    array start on a 64 byte boundary. Arrays that are already contiguous float64 are
+    written straight from their own memory, without copying."""
+
+    arrays = { name : value for name, value in aerofoil.items() if isinstance(value, np.ndarray) }
+    header = { 'digits' : [int(digit) for digit in digits],
+               'sampling' : sampling,
+               'degree' : None,
+               'knotVector' : None,
+               'arrays' : {} }
+
+    if curve is not None:
+        header['degree'] = int(curve.degree)
+        header['knotVector'] = [float(knot) for knot in curve.knotVector]
+        arrays['controlPoints'] = curve.controlPoints
+
+    arrays = { name : np.ascontiguousarray(value, dtype = _dtype) for name, value in arrays.items() }
+
+    # Offsets depend on the header length, which depends on the offsets, so lay the
+    # arrays out relative to the end of the header and fix up once its size is known.
+    relativeOffset = 0
+    for name, value in arrays.items():
+        header['arrays'][name] = { 'offset' : relativeOffset, 'shape' : list(value.shape) }
+        relativeOffset += _alignUp(value.nbytes)
+
+    headerSize = 0
+    while True:
+        encodedHeader = _encodeHeader(header, headerSize)
+        requiredSize = _alignUp(len(_magic) + 8 + len(encodedHeader))
+        if requiredSize <= headerSize:
+            break
+        headerSize = requiredSize
+
+    with open(fileName, 'wb') as file:
+        file.write(_magic)
+        file.write(struct.pack('<Q', len(encodedHeader)))
+        file.write(encodedHeader)
+        file.write(bytes(headerSize - len(_magic) - 8 - len(encodedHeader)))
+
+        for value in arrays.values():
+            file.write(memoryview(value).cast('B'))
+            file.write(bytes(_alignUp(value.nbytes) - value.nbytes))
+
+def readAerofoil(fileName):
+    """Opens a file written by writeAerofoil. The arrays are not read, but memory mapped
+    read only, so opening is fast however large the file is.
+
+    Inputs
+    ------
+    fileName : The file to read
+
+    Returns
+    -------
+    A dictionary with the fields digits, sampling, degree and knotVector from the header
+    (degree and knotVector are None if no curve was written), plus a np.memmap for each
+    array that was written, e.g. upper, lower and anticlockwise."""
+
+    with open(fileName, 'rb') as file:
+        if file.read(len(_magic)) != _magic:
+            raise ValueError("{} is not an aerofoil file".format(fileName))
+        headerLength, = struct.unpack('<Q', file.read(8))
+        header = json.loads(file.read(headerLength).decode('utf-8'))
+
+    result = { 'digits' : tuple(header['digits']),
+               'sampling' : header['sampling'],
+               'degree' : header['degree'],
+               'knotVector' : None if header['knotVector'] is None else np.array(header['knotVector']) }
+
+    for name, layout in header['arrays'].items():
+        shape = tuple(layout['shape'])
+        if np.prod(shape) == 0:
+            result[name] = np.empty(shape, dtype = _dtype)
+        else:
+            result[name] = np.memmap(fileName, dtype = _dtype, mode = 'r',
+                                     offset = layout['offset'], shape = shape)
+
+    return result
+
+def _alignUp(size):
+    return -(-size // _alignment) * _alignment
+
+def _encodeHeader(header, headerSize):
+    """Encodes the header, with array offsets made absolute for a header block of headerSize bytes."""
+
+    absolute = dict(header)
+    absolute['arrays'] = { name : { 'offset' : layout['offset'] + headerSize, 'shape' : layout['shape'] }
+                           for name, layout in header['arrays'].items() }
+    return json.dumps(absolute).encode('utf-8')
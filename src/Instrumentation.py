@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+# 
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+"""Opt-in timing of the hot paths in SplineAlgorithms and NacaCurves.
+
+Instrumented functions record their call count, time and array sizes only while
+recording is enabled, e.g.
+
+    with recording():
+        splineBasisFunctions(parameters, degree, knotVector)
+    print(statistics())
+
+When recording is disabled the instrumented functions are the plain functions, so
+they cost nothing extra. Enabling recording swaps a timing wrapper in for each of them,
+in every loaded module that refers to it by its own name, e.g. after
+'from SplineAlgorithms import findSpan'. Disabling recording swaps the plain functions
+back. References held any other way, e.g. under another name, always call the plain
+function."""
+
+import contextlib
+import functools
+import json
+import sys
+import time
+
+class _State:
+    enabled = False
+
+_statistics = {}
+_listeners = []
+_registry = []
+
+class CallStatistics:
+    """The totals recorded for one instrumented name."""
+
+    __slots__ = ('calls', 'seconds', 'totalSize', 'maxSize')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.totalSize = 0
+        self.maxSize = 0
+
+    def asDict(self):
+        return { 'calls' : self.calls,
+                 'seconds' : self.seconds,
+                 'totalSize' : self.totalSize,
+                 'maxSize' : self.maxSize }
+
+def instrumented(name, sizeOf = None):
+    """Decorator recording calls of the decorated function under the given name.
+
+    Inputs
+    ------
+    name : The name to record the calls under
+    sizeOf : Optional. A function given the same arguments as the decorated function,
+             returning the size of the problem, e.g. the number of parameters. If not
+             given, every call has size 1."""
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                size = 1 if sizeOf is None else sizeOf(*args, **kwargs)
+                _record(name, start, time.perf_counter() - start, size)
+
+        _registry.append((function, wrapper))
+        return wrapper if _State.enabled else function
+
+    return decorate
+
+class _Section:
+    __slots__ = ('name', 'size', 'start')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exceptionInfo):
+        _record(self.name, self.start, time.perf_counter() - self.start, self.size)
+
+_noSection = contextlib.nullcontext()
+
+def section(name, size = 1):
+    """Returns a context manager recording the time spent in a block under the given name,
+    for timing part of a function."""
+
+    return _Section(name, size) if _State.enabled else _noSection
+
+@contextlib.contextmanager
+def recording():
+    """Context manager enabling recording for the duration of a block. Yields the live
+    dictionary of CallStatistics, keyed by name."""
+
+    previous = _State.enabled
+    _setEnabled(True)
+    try:
+        yield _statistics
+    finally:
+        _setEnabled(previous)
+
+def enable():
+    """Starts recording."""
+    _setEnabled(True)
+
+def disable():
+    """Stops recording. The statistics recorded so far are kept."""
+    _setEnabled(False)
+
+def reset():
+    """Discards all the recorded statistics."""
+    _statistics.clear()
+
+def statistics():
+    """Returns a dictionary, keyed by name, of dictionaries of the calls, total seconds,
+    total size and maximum size recorded."""
+    return { name : entry.asDict() for name, entry in _statistics.items() }
+
+def exportStatistics(fileName):
+    """Writes statistics() to a JSON file."""
+    with open(fileName, 'w') as file:
+        json.dump(statistics(), file, indent = 2)
+
+def addListener(listener):
+    """Registers a function to be called after every recorded call or section, with the
+    name, start time (from time.perf_counter), duration and size. This can be used to
+    forward the events to an external profiler, e.g. as perf or tracing markers."""
+    _listeners.append(listener)
+
+def removeListener(listener):
+    """Unregisters a function registered with addListener."""
+    _listeners.remove(listener)
+
+def _setEnabled(enabled):
+    """Sets the recording flag, and swaps the wrapped or plain instrumented functions
+    into every loaded module."""
+
+    if enabled == _State.enabled:
+        return
+    _State.enabled = enabled
+
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, '__dict__', None)
+        if namespace is None:
+            continue
+
+        for function, wrapper in _registry:
+            old, new = (function, wrapper) if enabled else (wrapper, function)
+            if namespace.get(function.__name__) is old:
+                namespace[function.__name__] = new
+
+def _record(name, start, seconds, size):
+    entry = _statistics.get(name)
+    if entry is None:
+        entry = _statistics[name] = CallStatistics()
+
+    entry.calls += 1
+    entry.seconds += seconds
+    entry.totalSize += size
+    entry.maxSize = max(entry.maxSize, size)
+
+    for listener in _listeners:
+        listener(name, start, seconds, size)
@@ -17,9 +17,15 @@
 #    You should have received a copy of the GNU General Public License
 #    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import hashlib
+
 import numpy as np
+from Instrumentation import instrumented
 
-def create4DigitNacaAerofoil(camber, position, thickness, xValues):
+@instrumented('create4DigitNacaAerofoil',
+              lambda camber, position, thickness, xValues, *args, **kwargs: np.size(xValues))
+def create4DigitNacaAerofoil(camber, position, thickness, xValues, out = None, assumeSorted = False):
     """Creates a data sampling around a naca 4-digit aerofoil.
     
     Inputs
@@ -30,7 +36,14 @@ def create4DigitNacaAerofoil(camber, position, thickness, xValues):
     thickness: The thickness as a percent of a chord
     xValues: A ndarray containing the x coordinates to evaluate the curve at, 
              in chord length scaled coordinates. That is these should all be
-             in the range [0, 1]
+             in the range [0, 1]. This is never modified; if the values are not in
+             increasing order, a sorted copy is used.
+    out : Optional. A dictionary of preallocated arrays to write the results into,
+          with any of the keys of the returned dictionary. Arrays for missing keys
+          are allocated. For n x values, 'anticlockwise' must be (2n-1) x 2, and
+          the others n x 2.
+    assumeSorted : Optional. If True, the caller guarantees xValues is already in
+                   increasing order, and the O(n) check for this is skipped.
 
     Returns
     --------
@@ -47,140 +60,459 @@ def create4DigitNacaAerofoil(camber, position, thickness, xValues):
     digits of the NACA 4 digit series, e.g. craete_4_digit_naca_aerofoil(4, 4, 12)
     would then create the points on the NACA4412 shape."""
 
-    
-    xValues.sort()
+    if not assumeSorted and np.any(xValues[1:] < xValues[:-1]):
+        xValues = np.sort(xValues)
 
-    xt = _createThicknessDistribution(thickness, xValues)
-    xc = _createCamberDistribution(position, camber, xValues)
-    theta = _createThetaDistribution(position, camber, xValues)
+    numPoints = len(xValues)
+    out = {} if out is None else out
+    shapes = { 'thickness' : (numPoints, 2),
+               'camber' : (numPoints, 2),
+               'upper' : (numPoints, 2),
+               'lower' : (numPoints, 2),
+               'anticlockwise' : (2*numPoints - 1, 2) }
+    result = { key : out[key] if key in out else np.empty(shape)
+               for key, shape in shapes.items() }
 
-    x = xValues.transpose()
+    xt = result['thickness']
+    xc = result['camber']
+    xt[:, 0] = xValues
+    xc[:, 0] = xValues
 
-    xu = x - xt[:,1] * np.sin(theta)
-    yu = xc[:,1] + xt[:,1] * np.cos(theta)
+    upperSurface = result['upper']
+    lowerSurface = result['lower']
+    _evaluateSurfaces(camber, position, thickness, xValues,
+                      upperSurface, lowerSurface, xt[:, 1], xc[:, 1])
 
-    xl = x + xt[:,1] * np.sin(theta)
-    yl = xc[:,1] - xt[:,1] * np.cos(theta)
+    _normaliseSurface(upperSurface)
+    _normaliseSurface(lowerSurface)
 
-    upperSurface = _combineSurface(xu, yu)
-    lowerSurface = _combineSurface(xl, yl)
+    _combineSurfaces(upperSurface, lowerSurface, result['anticlockwise'])
 
-#    upperSurface = np.vstack((xu, yu)).transpose()
-#    lowerSurface = np.vstack((xl, yl)).transpose()
+    return result
 
-    
+def generate4DigitNacaAerofoilChunks(camber, position, thickness, xValues, chunkSize = 65536):
+    """Generates the anticlockwise points around a naca 4-digit aerofoil a chunk at a time.
 
-    anticlockwise = _combineSurfaces(upperSurface, lowerSurface)
+    This gives the same points as the 'anticlockwise' output of create4DigitNacaAerofoil,
+    but never holds more than a chunk's worth of intermediate arrays, so the memory used
+    does not grow with the number of x values.
 
-    return { 'thickness' : xt,
-             'camber' : xc, 
-             'upper' : upperSurface, 
-             'lower' : lowerSurface, 
-             'anticlockwise' : anticlockwise }
+    Inputs
+    ------
+    camber, position, thickness : The NACA digits, as for create4DigitNacaAerofoil
+    xValues: A ndarray containing the x coordinates to evaluate the curve at. Unlike
+             create4DigitNacaAerofoil these must already be in increasing order, as
+             sorting would need a full size copy. May be a np.memmap.
+    chunkSize : The maximum number of points in each chunk
+
+    Returns
+    --------
+    A generator of 2d arrays (x and y) of consecutive points, anticlockwise from
+    the trailing edge.
+
+    Notes
+    -----
+    The points are scaled to unit chord for each surface, which needs the extent of
+    each surface. So there are two passes: a first which only finds the x extents of
+    the surfaces, and a second which generates the points. The second pass goes through
+    the chunks backwards for the upper surface and then forwards for the lower. Each
+    surface is built once, but the camber line and thickness they share are evaluated
+    for both, except in the leading edge chunk, which is where the two loops meet."""
+
+    numPoints = len(xValues)
+    starts = range(0, numPoints, chunkSize)
+
+    upperLimits = [np.inf, -np.inf]
+    lowerLimits = [np.inf, -np.inf]
+    previous = -np.inf
+    for start in starts:
+        x = xValues[start:start + chunkSize]
+        if x[0] < previous or np.any(x[1:] < x[:-1]):
+            raise ValueError("xValues must be in increasing order")
+        previous = x[-1]
+
+        _, ytSin, surfaceX = _evaluateOffsetChunk(camber, position, thickness, x)
+        for combine, limits in ((np.subtract, upperLimits), (np.add, lowerLimits)):
+            combine(x, ytSin, out = surfaceX)
+            limits[0] = min(limits[0], np.min(surfaceX))
+            limits[1] = max(limits[1], np.max(surfaceX))
+
+    # The upper surface goes backwards from the trailing edge, and skips its first
+    # point, as _combineSurfaces does. The lower surface starts with the chunk the
+    # upper surface finishes with, so that chunk's offsets are reused.
+    for start in reversed(starts):
+        x = xValues[start:start + chunkSize]
+        offsets = _evaluateOffsetChunk(camber, position, thickness, x)
+        upperSurface = _offsetSurface(x, offsets, True)[1 if start == 0 else 0:]
+        if len(upperSurface) > 0:
+            _scaleSurface(upperSurface, upperLimits[0], upperLimits[1] - upperLimits[0])
+            yield upperSurface[::-1]
+
+    for start in starts:
+        x = xValues[start:start + chunkSize]
+        if start > 0:
+            offsets = _evaluateOffsetChunk(camber, position, thickness, x)
+        lowerSurface = _offsetSurface(x, offsets, False)
+        _scaleSurface(lowerSurface, lowerLimits[0], lowerLimits[1] - lowerLimits[0])
+        yield lowerSurface
+
+class AerofoilCache:
+    """A bounded, least recently used cache of create4DigitNacaAerofoil results.
+
+    The arrays handed out are read only, and each caller gets its own dictionary of
+    them, so the same result can safely be shared between all the callers asking for it.
 
-def _combineSurface(xValues, yValues):
-    """Combines xValues and yValues into a single array.
-    
     Inputs
     ------
-    xValues : An array of x values  This should have the same shape as yVales.
-    yValues : An array of y values. This should have the same shape as xValues."""
+    maxSize : The maximum number of aerofoils to keep. When full, the least recently
+              used aerofoil is evicted."""
 
-    x0 = min(xValues)
-    x1 = max(xValues)
+    def __init__(self, maxSize = 128):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
 
-    chordLength = x1 - x0
+    def get(self, camber, position, thickness, xValues):
+        """Returns the aerofoil for the given digits and x values, creating it if it
+        is not already cached. The arguments are as for create4DigitNacaAerofoil,
+        but xValues is not modified."""
 
-    xOnChord = (xValues - x0)/chordLength;
-    yOnChord = yValues / chordLength;
+        xValues = np.ascontiguousarray(xValues, dtype=float)
+        key = (camber, position, thickness, xValues.shape,
+               hashlib.sha1(xValues.tobytes()).hexdigest())
 
-    return np.vstack((xOnChord, yOnChord)).transpose()
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return dict(self._entries[key])
 
-def _createCamberDistribution(position, maximum, x):
-    m = maximum / 100
-    p = position / 10
+        self.misses += 1
+        aerofoil = create4DigitNacaAerofoil(camber, position, thickness, xValues)
+        for array in aerofoil.values():
+            array.setflags(write = False)
 
-    beforeJink = x < p
+        self._entries[key] = aerofoil
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last = False)
 
-    if p != 0:
-        camberBefore = m * x/(p*p) * (2*p - x)
-    else:
-        camberBefore = 0 * x
+        return dict(aerofoil)
+
+    def clear(self):
+        """Removes all the cached aerofoils and resets the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def statistics(self):
+        """Returns a dictionary of the hits, misses, current size and maximum size of the cache."""
+        return { 'hits' : self.hits,
+                 'misses' : self.misses,
+                 'size' : len(self._entries),
+                 'maxSize' : self.maxSize }
 
-    camberAfter = m * (1-x) / pow(( 1 - p), 2) * ( 1 + x  - 2*p)
+defaultAerofoilCache = AerofoilCache()
 
-    final = np.where(beforeJink, camberBefore, camberAfter)
+def cached4DigitNacaAerofoil(camber, position, thickness, xValues):
+    """Returns create4DigitNacaAerofoil(camber, position, thickness, xValues) from
+    defaultAerofoilCache. The returned arrays are read only."""
 
-    return np.vstack((x, final)).transpose()
+    return defaultAerofoilCache.get(camber, position, thickness, xValues)
 
-def _createThetaDistribution(position, maximum, x):
-    x_dcdx = _createDerivativeCamberDistribution(position, maximum, x)
+def create4DigitNacaFamily(cambers, positions, thicknesses, xValues):
+    """Creates data samplings around a whole family of naca 4-digit aerofoils at once.
 
-    return np.arctan(x_dcdx)
+    Inputs
+    ------
+    cambers : The maximum cambers, with the same meaning as for create4DigitNacaAerofoil
+    positions: The positions of maximum camber, with the same meaning as for create4DigitNacaAerofoil
+    thicknesses: The thicknesses, with the same meaning as for create4DigitNacaAerofoil
+    xValues: A ndarray containing the x coordinates to evaluate every curve at, 
+             in chord length scaled coordinates. This is not modified.
+
+    cambers, positions and thicknesses are broadcast against each other, so any of them
+    may be a single value. The aerofoils are in the order of the flattened broadcast arrays.
+
+    Returns
+    --------
+    A dictionary with the following fields, each a 3d array where the first index
+    corresponds to aerofoil, the second to point number, and the third to x and y:
+       upper : The upper surface points
+       lower : The lower surface points
+       anticlockwise: The full points, anticlockwise from the trailing edge"""
+
+    cambers, positions, thicknesses = np.broadcast_arrays(cambers, positions, thicknesses)
+    x = np.sort(xValues)
+
+    numAerofoils = cambers.size
+    numPoints = len(x)
+
+    upper = np.empty([numAerofoils, numPoints, 2])
+    lower = np.empty([numAerofoils, numPoints, 2])
+    _evaluateSurfaces(cambers.reshape(-1, 1), positions.reshape(-1, 1), thicknesses.reshape(-1, 1), x,
+                      upper, lower, np.empty([numAerofoils, numPoints]), np.empty([numAerofoils, numPoints]))
+
+    _normaliseSurface(upper)
+    _normaliseSurface(lower)
+
+    anticlockwise = np.empty([numAerofoils, 2*numPoints - 1, 2])
+    _combineSurfaces(upper, lower, anticlockwise)
+
+    return { 'upper' : upper,
+             'lower' : lower,
+             'anticlockwise' : anticlockwise }
+
+def adaptiveXValues(camber, position, thickness, tolerance = 1e-4, maxPoints = 10001):
+    """Chooses x values to sample a naca 4-digit aerofoil at, so that straight lines
+    between neighbouring points stay within a tolerance of the true surfaces.
+
+    Inputs
+    ------
+    camber, position, thickness : The NACA digits, as for create4DigitNacaAerofoil
+    tolerance : The allowed distance, as a fraction of chord, between each surface and
+                the straight line joining neighbouring points on it. This is measured
+                before create4DigitNacaAerofoil scales the surfaces to unit chord.
+    maxPoints : The most x values to return. Refinement stops early, leaving the worst
+                intervals unsplit, if it would need more. This must be at least the
+                number of starting x values: 9, plus the position of maximum camber
+                if that is not already one of them.
+
+    Returns
+    -------
+    An increasing array of x values, starting at 0 and ending at 1, which can be passed
+    to create4DigitNacaAerofoil with assumeSorted = True.
+
+    Notes
+    -----
+    Every interval whose chord error is too large is split at once, and the new midpoints
+    evaluated together, so there is one pass per level of refinement. The error is
+    measured at the midpoint, so intervals are refined where the surface curvature is
+    high. Intervals are split at the midpoint of sqrt(x), which refines towards the
+    leading edge where the surfaces behave like sqrt(x). The position of maximum camber,
+    where the camber line's curvature jumps, is always one of the x values."""
 
-def _createDerivativeCamberDistribution(position, maximum, x):
-    m = maximum / 100
     p = position / 10
+    x = np.linspace(0, 1, 9)**2
+    if camber != 0 and 0 < p < 1:
+        x = np.union1d(x, [p])
 
+    if maxPoints < len(x):
+        raise ValueError("maxPoints must be at least the {} starting x values, got {}"
+                         .format(len(x), maxPoints))
 
-    
-    beforeJink = x < p    
-    if p != 0:
-        derivativeBefore = 2*m /(p*p) * (p - x)
-    else:
-        derivativeBefore = 0 * x
+    upper, lower = _evaluateSurfaceChunk(camber, position, thickness, x)
+    while len(x) < maxPoints:
+        sqrtX = np.sqrt(x)
+        midpoints = np.square((sqrtX[:-1] + sqrtX[1:]) / 2)
+        midUpper, midLower = _evaluateSurfaceChunk(camber, position, thickness, midpoints)
 
-    derivativeAfter = 2*m / pow(( 1 - p), 2) * ( p - x)
+        errors = np.maximum(_chordErrors(upper[:-1], upper[1:], midUpper),
+                            _chordErrors(lower[:-1], lower[1:], midLower))
+        split = np.flatnonzero(errors > tolerance)
+        if len(split) == 0:
+            break
 
-    return np.where(beforeJink, derivativeBefore, derivativeAfter)
-    
+        room = maxPoints - len(x)
+        if len(split) > room:
+            split = np.sort(split[np.argsort(errors[split])[len(split) - room:]])
+
+        x = np.insert(x, split + 1, midpoints[split])
+        upper = np.insert(upper, split + 1, midUpper[split], axis = 0)
+        lower = np.insert(lower, split + 1, midLower[split], axis = 0)
+
+    return x
+
+def _evaluateSurfaces(camber, position, thickness, x, upperSurface, lowerSurface, yt, yc):
+    """Evaluates the upper and lower surface points, before scaling to unit chord, writing
+    them straight into the given buffers.
+
+    Inputs
+    ------
+    camber, position, thickness : The NACA digits, as for create4DigitNacaAerofoil. These
+                                  may be arrays shaped to broadcast against x, in which case
+                                  the buffers have an extra leading dimension.
+    x : The x values to evaluate at
+    upperSurface : Buffer for the upper surface points, with x and y in the last index
+    lowerSurface : Buffer for the lower surface points, with x and y in the last index
+    yt : Buffer for the thickness distribution
+    yc : Buffer for the camber line
+
+    Notes
+    -----
+    Compared with evaluating the textbook formulae directly, this evaluates the thickness
+    polynomial using Horner's scheme, and uses cos(theta) = 1/sqrt(1 + slope^2) and
+    sin(theta) = slope cos(theta) rather than going through arctan. Apart from the
+    jink mask, the only temporary is the one work buffer."""
+
+    ytSin, ytCos = _evaluateSurfaceOffsets(camber, position, thickness, x, yt, yc)
+
+    np.subtract(x, ytSin, out = upperSurface[..., 0])
+    np.add(yc, ytCos, out = upperSurface[..., 1])
+    np.add(x, ytSin, out = lowerSurface[..., 0])
+    np.subtract(yc, ytCos, out = lowerSurface[..., 1])
+
+def _evaluateSurfaceOffsets(camber, position, thickness, x, yt, yc):
+    """Evaluates the thickness distribution into yt and the camber line into yc, and
+    returns newly allocated arrays of (yt sin(theta), yt cos(theta)). The upper surface
+    is (x - yt sin(theta), yc + yt cos(theta)), and the lower surface
+    (x + yt sin(theta), yc - yt cos(theta)). The inputs are as for _evaluateSurfaces."""
+
+    m = np.asarray(camber, dtype=float) / 100
+    p = np.asarray(position, dtype=float) / 10
+
+    work = np.empty(np.broadcast(x, p).shape)
+    _evaluateThickness(thickness, x, yt, work)
+
+    # Both parts of the camber line have the form yc = k (x (2p - x) + c), with slope
+    # 2k (p - x). Before the jink k = m / p^2 and c = 0, after it k = m / (1-p)^2 and
+    # c = 1 - 2p. When p is 0 there is no part before the jink.
+    beforeJink = x < p
+    kBefore = np.divide(m, p*p, out = np.zeros(np.broadcast(m, p).shape), where = p != 0)
+    kAfter = m / pow(1 - p, 2)
+    k = np.where(beforeJink, kBefore, kAfter)
+
+    np.subtract(2*p, x, out = yc)
+    yc *= x
+    yc += np.where(beforeJink, 0, 1 - 2*p)
+    yc *= k
+
+    # work holds the slope, then cos(theta)
+    np.subtract(p, x, out = work)
+    work *= 2*k
+    slope = k
+    slope[...] = work
+    np.multiply(work, work, out = work)
+    work += 1
+    np.sqrt(work, out = work)
+    np.reciprocal(work, out = work)
+
+    # slope becomes yt sin(theta), work becomes yt cos(theta)
+    slope *= work
+    slope *= yt
+    work *= yt
+
+    return slope, work
+
+def _evaluateThickness(thickness, x, yt, work):
+    """Evaluates the thickness distribution into yt using Horner's scheme. work is a
+    buffer of the same shape as yt, which is overwritten."""
+
+    t = np.asarray(thickness, dtype=float) / 100
+
+    # Thickness equation taken from Wikipedia naca page...
+    # yt = 5t (0.2969 sqrt(x) - 0.1260 x - 0.3516 x^2 + 0.2843 x^3 - 0.1015 x^4)
+    np.multiply(x, -0.1015, out = yt)
+    yt += 0.2843
+    yt *= x
+    yt -= 0.3516
+    yt *= x
+    yt -= 0.1260
+    yt *= x
+    np.sqrt(x, out = work)
+    work *= 0.2969
+    yt += work
+    yt *= 5*t
 
 def _createThicknessDistribution(thickness, xValues):
-    """Evaluates the thickness distribution at xVales
+    """Evaluates the thickness distribution at xValues
 
     Inputs
     ------
     thickness : The thickness distribution. This has the same meaning as 
-                for create_4digit_naca_aerofoil.
+                for create4DigitNacaAerofoil.
     xValues : The xValues to evaluate at.
 
     Returns
     -------
-    The evaluated thickness distribution."""
+    The evaluated thickness distribution, as a 2d array (x and thickness at that x)."""
+
+    x = np.asarray(xValues, dtype=float)
+    distribution = np.empty([len(x), 2])
+    distribution[:, 0] = x
+    _evaluateThickness(thickness, x, distribution[:, 1], np.empty(len(x)))
+    return distribution
+
+def _evaluateSurfaceChunk(camber, position, thickness, x):
+    """Returns newly allocated (upper, lower) surface points for x, before scaling to unit chord."""
+
+    upperSurface = np.empty([len(x), 2])
+    lowerSurface = np.empty([len(x), 2])
+    _evaluateSurfaces(camber, position, thickness, x, upperSurface, lowerSurface,
+                      np.empty(len(x)), np.empty(len(x)))
+    return upperSurface, lowerSurface
+
+def _evaluateOffsetChunk(camber, position, thickness, x):
+    """Returns newly allocated (yc, yt sin(theta), yt cos(theta)) for x, from which
+    _offsetSurface builds either surface."""
+
+    yc = np.empty(len(x))
+    ytSin, ytCos = _evaluateSurfaceOffsets(camber, position, thickness, x, np.empty(len(x)), yc)
+    return yc, ytSin, ytCos
+
+def _offsetSurface(x, offsets, upper):
+    """Returns newly allocated upper surface points if upper is True, or lower surface
+    points otherwise, before scaling to unit chord, from the _evaluateOffsetChunk output."""
+
+    yc, ytSin, ytCos = offsets
+    surface = np.empty([len(x), 2])
+    if upper:
+        np.subtract(x, ytSin, out = surface[:, 0])
+        np.add(yc, ytCos, out = surface[:, 1])
+    else:
+        np.add(x, ytSin, out = surface[:, 0])
+        np.subtract(yc, ytCos, out = surface[:, 1])
+    return surface
+
+def _chordErrors(starts, ends, midpoints):
+    """Returns the distance of each midpoint from the line through the corresponding
+    start and end points. All three are arrays of 2d points."""
+
+    chords = ends - starts
+    offsets = midpoints - starts
+    lengths = np.hypot(chords[:, 0], chords[:, 1])
+    crossProducts = np.abs(chords[:, 0] * offsets[:, 1] - chords[:, 1] * offsets[:, 0])
+    return np.divide(crossProducts, lengths, out = np.hypot(offsets[:, 0], offsets[:, 1]),
+                     where = lengths > 0)
+
+def _normaliseSurface(surface):
+    """Scales surface points in place so the surface runs from x = 0 to x = 1.
+    
+    Inputs
+    ------
+    surface : The surface points, with point number in the second to last index and
+              x and y in the last index. Any leading indices are treated as separate
+              surfaces."""
 
-    x = xValues
-    x2 = np.power(x, 2)
-    x3 = np.power(x, 3)
-    x4 = np.power(x, 4)
-    rootX = np.sqrt(x)
+    x0 = np.min(surface[..., 0], axis = -1)[..., np.newaxis]
+    x1 = np.max(surface[..., 0], axis = -1)[..., np.newaxis]
 
-    # Thickness equation taken from Wikipedia naca page...
-    y = 5*thickness/100 * ( 0.2969 * rootX - 0.1260 * x - 0.3516 * x2 + 0.2843 * x3 - 0.1015 * x4 )
+    _scaleSurface(surface, x0, x1 - x0)
 
-    xy = np.vstack((x,y))
-    return xy.transpose()
-    
+def _scaleSurface(surface, x0, chordLength):
+    """Scales surface points in place, given the leading edge x0 and chord length,
+    which must broadcast against surface[..., 0]."""
+
+    surface[..., 0] -= x0
+    surface /= np.asarray(chordLength)[..., np.newaxis]
 
-def _combineSurfaces(upperSurface, lowerSurface):
+def _combineSurfaces(upperSurface, lowerSurface, anticlockwise = None):
     """Combines the two surfaces into an anticlockwise surface
 
     Inputs
     ------
-    upperSurface : ndarray containing the upper surface points. The first index
-                   is expected to correspond to point number, and the second index
+    upperSurface : ndarray containing the upper surface points. The second to last index
+                   is expected to correspond to point number, and the last index
                    to dimension. That is three points would look like [[0 0],[0.5 0.1],[1 0]]
     lowerSurface : ndarray containing the lower surface points, with the same index 
                    meaning as for the inputs.
+    anticlockwise : Optional. ndarray to write the result into. A new array is
+                    allocated if this is not given.
 
     Outputs
     -------
     single array, with the points reversed along the uppers surface, with the same index
     meaning as for the inputs."""
 
-    upperReverse = np.flipud(upperSurface);
-    
-    # remove the last point from the  upper surface, as it should be the same as
+    # remove the first point from the upper surface, as it should be the same as
     # the first point on the lower surface
-    return np.vstack([upperReverse[0:-1, :], lowerSurface])
-    
-   
+    return np.concatenate((upperSurface[..., :0:-1, :], lowerSurface), axis = -2, out = anticlockwise)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+# 
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+import concurrent.futures
+import itertools
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from NacaCurves import create4DigitNacaFamily
+from SplineFitting import fitSplineCurve
+
+def runNacaSweep(xValues, cambers = range(0, 10), positions = range(0, 10), thicknesses = range(1, 41),
+                 degree = None, numControlPoints = None, maxWorkers = None, shardSize = 100,
+                 checkpointFile = None):
+    """Generates, and optionally fits splines to, every combination of the given NACA
+    4-digit parameters, spread across a pool of processes.
+
+    Inputs
+    ------
+    xValues : The x values to sample every aerofoil at, as for create4DigitNacaAerofoil
+    cambers, positions, thicknesses : The values of each digit to sweep over. The
+                                      defaults cover the whole 4-digit series.
+    degree : Optional. The degree of spline to fit to each aerofoil's anticlockwise points
+    numControlPoints : Optional. The number of control points of each fitted spline. Splines
+                       are only fitted if both this and degree are given.
+    maxWorkers : The number of worker processes. Defaults to the number of processors.
+    shardSize : The number of aerofoils each worker handles at a time
+    checkpointFile : Optional. A .npz file that progress is saved to after every shard, with
+                     the results kept in checkpointFile.<name>.npy files alongside it. If it
+                     exists when the sweep starts, shards it records as done are not rerun.
+                     It must be for the same digits, x values, fitting and shardSize.
+
+    Returns
+    -------
+    A dictionary with the following fields:
+       digits : An integer array with the camber, position and thickness of each aerofoil
+       anticlockwise : A 3d array of the anticlockwise points. The first index corresponds
+                       to aerofoil, matching digits.
+    and, if splines were fitted,
+       knotVectors : A 2d array of the knot vector of each fitted spline
+       controlPoints : A 3d array of the control points of each fitted spline
+
+    Notes
+    -----
+    Workers write their results straight into shared memory blocks created by this
+    process, so no arrays are pickled between processes."""
+
+    xValues = np.sort(xValues)
+    digits = np.array(list(itertools.product(cambers, positions, thicknesses)), dtype=int).reshape(-1, 3)
+    numAerofoils = len(digits)
+    fitting = degree is not None and numControlPoints is not None
+
+    shapes = { 'anticlockwise' : (numAerofoils, 2*len(xValues) - 1, 2) }
+    if fitting:
+        shapes['knotVectors'] = (numAerofoils, numControlPoints + degree)
+        shapes['controlPoints'] = (numAerofoils, numControlPoints, 2)
+
+    shards = [(start, min(start + shardSize, numAerofoils)) for start in range(0, numAerofoils, shardSize)]
+    done = np.zeros(len(shards), dtype=bool)
+
+    settings = { 'digits' : digits,
+                 'xValues' : xValues,
+                 'fitting' : np.array([degree if fitting else -1, numControlPoints if fitting else -1]),
+                 'shardSize' : np.array(shardSize) }
+
+    blocks = {}
+    stored = {}
+    try:
+        arrays = {}
+        for name, shape in shapes.items():
+            blocks[name] = shared_memory.SharedMemory(create=True, size=max(8, int(np.prod(shape)) * 8))
+            arrays[name] = np.ndarray(shape, dtype=float, buffer=blocks[name].buf)
+
+        if checkpointFile is not None:
+            stored = _openCheckpoint(checkpointFile, settings, shapes, done)
+            for index in np.flatnonzero(done):
+                start, stop = shards[index]
+                for name, array in arrays.items():
+                    array[start:stop] = stored[name][start:stop]
+
+        layout = { name : (blocks[name].name, shape) for name, shape in shapes.items() }
+        with concurrent.futures.ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+            futures = { executor.submit(_sweepShard, start, stop, digits[start:stop], xValues,
+                                        degree if fitting else None, numControlPoints, layout) : index
+                        for index, (start, stop) in enumerate(shards) if not done[index] }
+
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                index = futures[future]
+                done[index] = True
+                if checkpointFile is not None:
+                    _saveCheckpoint(checkpointFile, settings, done, stored, arrays, *shards[index])
+
+        result = { name : array.copy() for name, array in arrays.items() }
+        result['digits'] = digits
+        return result
+
+    finally:
+        arrays = None
+        stored = None
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+def _sweepShard(start, stop, digits, xValues, degree, numControlPoints, layout):
+    """Worker for runNacaSweep. Generates, and fits, aerofoils start to stop - 1, writing the
+    results into the shared memory blocks described by layout (name -> (block name, shape))."""
+
+    blocks = { name : shared_memory.SharedMemory(name=blockName) for name, (blockName, shape) in layout.items() }
+    try:
+        arrays = { name : np.ndarray(layout[name][1], dtype=float, buffer=block.buf)
+                   for name, block in blocks.items() }
+
+        family = create4DigitNacaFamily(digits[:, 0], digits[:, 1], digits[:, 2], xValues)
+        arrays['anticlockwise'][start:stop] = family['anticlockwise']
+
+        if degree is not None:
+            for i, points in enumerate(family['anticlockwise']):
+                curve = fitSplineCurve(points, degree, numControlPoints)['curve']
+                arrays['knotVectors'][start + i] = curve.knotVector
+                arrays['controlPoints'][start + i] = curve.controlPoints
+
+        arrays = None
+    finally:
+        for block in blocks.values():
+            block.close()
+
+    return start, stop
+
+def _openCheckpoint(checkpointFile, settings, shapes, done):
+    """Opens the result files of a checkpoint as memory maps, creating them if the
+    checkpoint doesn't exist yet. If it does, fills in done with the shards it records
+    as finished.
+
+    Returns
+    -------
+    A dictionary of the memory mapped result arrays, with the same keys as shapes."""
+
+    if not os.path.exists(checkpointFile):
+        return { name : np.lib.format.open_memmap(_checkpointArrayFile(checkpointFile, name), mode='w+',
+                                                  dtype=float, shape=shape)
+                 for name, shape in shapes.items() }
+
+    with np.load(checkpointFile) as checkpoint:
+        if any(not np.array_equal(checkpoint[name], value) for name, value in settings.items()):
+            raise ValueError("Checkpoint {} is for a different sweep".format(checkpointFile))
+        done[:] = checkpoint['done']
+
+    return { name : np.load(_checkpointArrayFile(checkpointFile, name), mmap_mode='r+')
+             for name in shapes }
+
+def _saveCheckpoint(checkpointFile, settings, done, stored, arrays, start, stop):
+    """Records aerofoils start to stop - 1 as finished. Only their results are written,
+    and they are flushed before the done flags are saved, so an interrupted save never
+    leaves a shard marked done without its results."""
+
+    for name, array in arrays.items():
+        stored[name][start:stop] = array[start:stop]
+        stored[name].flush()
+
+    temporaryFile = checkpointFile + '.tmp.npz'
+    np.savez(temporaryFile, done=done, **settings)
+    os.replace(temporaryFile, checkpointFile)
+
+def _checkpointArrayFile(checkpointFile, name):
+    return '{}.{}.npy'.format(checkpointFile, name)
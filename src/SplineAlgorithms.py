@@ -1,5 +1,13 @@
+import collections
+import functools
+import hashlib
+import math
+
 import numpy as np
+from Instrumentation import instrumented
+from Instrumentation import section
 
+@instrumented('findSpan')
 def findSpan(degree, u, knotVector):
     """Counts spans in a knot vector.
     
@@ -7,7 +15,8 @@ def findSpan(degree, u, knotVector):
     of a given degree, calculate the span in the knot vector.
 
     See the Nurbs book. This is a variant of Algorithm A2.1 (with different handling if
-    the parameter is outside the knot span).
+    the parameter is outside the knot span). The span is found by bisection, so the
+    cost is O(log(number of knots)).
 
     Inputs
     ------
@@ -30,14 +39,47 @@ def findSpan(degree, u, knotVector):
     if knotVector[0] > u:
         return degree
 
-    i = 0;
-    for knot in knotVector:
-        if knot > u:
-            return i
-        i = i + 1
+    # Bisect for the first knot strictly greater than u. The checks above
+    # guarantee U(low) <= u < U(high) on entry, and the loop keeps it that way.
+    low = 0
+    high = numSpans
+    while high - low > 1:
+        mid = (low + high) // 2
+        if u < knotVector[mid]:
+            high = mid
+        else:
+            low = mid
+
+    return high
+
+@instrumented('findSpans', lambda degree, parameters, *args, **kwargs: np.size(parameters))
+def findSpans(degree, parameters, knotVector):
+    """Finds the spans of a whole array of parameter values in a knot vector.
 
+    This is the vectorised form of findSpan, and follows the same rules for
+    parameters outside the knot vector.
 
-    return numSpans
+    Inputs
+    ------
+    degree : The degree of the curve this knot vector corresponds to. degree = polynomial order + 1,
+             so degree is 2 for a linear curve, 3 for quadratic etc.
+    parameters : An array of line parameter values
+    knotVector : The sequence of knots. Expected that the values never decreates, that is 
+                 U(i+1) >= U(i).
+
+    Returns
+    -------
+    An integer array, the same shape as parameters, containing the span of each parameter."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    parameters = np.asarray(parameters, dtype=float)
+    numSpans = len(knotVector) - (degree - 1)
+
+    spans = np.searchsorted(knotVector, parameters, side='right')
+    spans = np.where(knotVector[0] > parameters, degree, spans)
+    spans = np.where(parameters >= knotVector[numSpans], numSpans - 1, spans)
+
+    return spans
 
 def bernsteinFunctions(parameters, degree):
     """Evaluates all the Bernstein functions of the given degree,
@@ -52,14 +94,37 @@ def bernsteinFunctions(parameters, degree):
     -------
     A 2d array. The first index corresponds to parameters. The second index corresponds
     to basis function index.
+
+    Notes
+    -----
+    This gives the same values (up to rounding) as splineBasisFunctions with a knot
+    vector of degree zeros followed by degree ones, but uses the closed form of the
+    polynomials.
     """
-    
-    firstHalf = np.zeros(degree)
-    secondHalf = np.ones(degree)
 
-    knotVector = np.concatenate((firstHalf, secondHalf))
-    return splineBasisFunctions(parameters, degree, knotVector)
+    parameters = np.asarray(parameters, dtype=float)
+    order = degree - 1
+
+    # B(i, n)(u) = (n choose i) u^i (1-u)^(n-i), built from tables of powers
+    # of u and 1 - u.
+    uPowers = np.ones([len(parameters), degree])
+    oneMinusUPowers = np.ones([len(parameters), degree])
+    for i in range(1, degree):
+        uPowers[:, i] = uPowers[:, i-1] * parameters
+        oneMinusUPowers[:, i] = oneMinusUPowers[:, i-1] * (1 - parameters)
+
+    return _binomialCoefficients(order) * uPowers * oneMinusUPowers[:, ::-1]
+
+@functools.lru_cache(maxsize = None)
+def _binomialCoefficients(order):
+    """Returns the row of Pascal's triangle for the given polynomial order as a
+    read only array."""
 
+    coefficients = np.array([math.comb(order, i) for i in range(0, order + 1)], dtype=float)
+    coefficients.setflags(write = False)
+    return coefficients
+
+@instrumented('splineBasisFunctions', lambda parameters, *args, **kwargs: np.size(parameters))
 def splineBasisFunctions(parameters, degree, knotVector):
     """Evaluates the full set of all basis functions at a set of given parameters.
     The benefit of this is that a set of points on a spline can then be
@@ -79,21 +144,672 @@ def splineBasisFunctions(parameters, degree, knotVector):
 
     Notes
     -----
-    This function uses findSpan to get the span. So passing one parameter in gives
+    This function uses findSpans to get the spans, and splineBasisFunctionsAtParameters
+    to evaluate the non-zero basis functions for all of them together. So passing one parameter in gives
     the same answer as splineBasisFucntionsAtSingleParamterm but as a matrix rather than
     a row vector. This assumes that the corect span would have been passed to the single parameter
     version
 """
     numBasis = len(knotVector) - degree
     basis = np.zeros([len(parameters), numBasis])
-    for i in range(0,len(parameters)):
-        u = parameters[i]
-        span = findSpan(degree, u, knotVector)
-        basisForParam = splineBasisFunctionsAtSingleParameter(span, u, degree, knotVector)
-        basis[i,span-degree:span] = basisForParam
+    spans, basisForParams = bandedSplineBasisFunctions(parameters, degree, knotVector)
+
+    with section('splineBasisFunctions.fill', len(parameters)):
+        rows = np.arange(len(parameters))[:, np.newaxis]
+        columns = spans[:, np.newaxis] - degree + np.arange(degree)
+        basis[rows, columns] = basisForParams
 
     return basis
+
+class BSplineCurve:
+    """A B-spline curve, with the knot vector data that every evaluation needs
+    calculated once up front.
+
+    Inputs
+    ------
+    degree: The degree of the curve. degree = polynomial order + 1.
+    knotVector: The knot vector. Expected that the values never decrease.
+    controlPoints : The control points. The first index corresponds to basis function
+                    index, any further indices to dimension."""
+
+    __slots__ = ('degree', 'knotVector', 'controlPoints', 'numSpans',
+                 '_uniqueKnots', '_uniqueKnotSpans', '_reciprocalKnotDifferences',
+                 '_uniformSpacing', '_spanPolynomials', '_regularPolynomial', '_irregularSpans')
+
+    def __init__(self, degree, knotVector, controlPoints):
+        self.degree = degree
+        self.knotVector = np.ascontiguousarray(knotVector, dtype=np.float64)
+        self.controlPoints = np.ascontiguousarray(controlPoints, dtype=np.float64)
+
+        numBasis = len(self.knotVector) - degree
+        if len(self.controlPoints) != numBasis:
+            raise ValueError("Expected {} control points for a knot vector of length {} and degree {}, got {}"
+                             .format(numBasis, len(self.knotVector), degree, len(self.controlPoints)))
+
+        self.numSpans = len(self.knotVector) - (degree - 1)
+
+        # Parameters in [unique(k), unique(k+1)) all share the span of unique(k),
+        # so a search over the (shorter) unique knots finds the span.
+        self._uniqueKnots = np.unique(self.knotVector)
+        self._uniqueKnotSpans = np.searchsorted(self.knotVector, self._uniqueKnots, side='right')
+
+        numKnots = len(self.knotVector)
+        self._reciprocalKnotDifferences = np.zeros([degree, numKnots])
+        for j in range(1, degree):
+            differences = self.knotVector[j:] - self.knotVector[:-j]
+            nonZero = differences > 0
+            reciprocals = np.zeros(numKnots - j)
+            reciprocals[nonZero] = 1 / differences[nonZero]
+            self._reciprocalKnotDifferences[j, :numKnots - j] = reciprocals
+
+        self._uniformSpacing = None
+        if self._isClampedUniform():
+            self._prepareUniformEvaluation()
+
+    def _isClampedUniform(self):
+        """True if the distinct knots are evenly spaced, and the first and last spans
+        start and end at the first and last distinct knots."""
+
+        gaps = np.diff(self._uniqueKnots)
+        lastSpan = self.numSpans - 1
+        return (len(gaps) > 0
+                and np.allclose(gaps, gaps[0], rtol = 1e-12, atol = 0)
+                and self._uniqueKnotSpans[0] == self.degree
+                and self.knotVector[lastSpan - 1] < self.knotVector[lastSpan])
+
+    def _prepareUniformEvaluation(self):
+        """Tabulates the basis functions on every span as polynomials in the local coordinate
+        t = (u - U(span-1)) / spacing. Spans away from repeated knots all share the same
+        polynomials, which are kept separately as the regular polynomial."""
+
+        spacing = self._uniqueKnots[1] - self._uniqueKnots[0]
+        nonEmptySpans = [span for span in range(self.degree, self.numSpans)
+                         if self.knotVector[span - 1] < self.knotVector[span]]
+
+        self._spanPolynomials = np.zeros([self.numSpans, self.degree, self.degree])
+        for span in nonEmptySpans:
+            self._spanPolynomials[span] = _spanBasisPolynomials(span, self.degree, self.knotVector, spacing)
+
+        self._regularPolynomial = self._spanPolynomials[nonEmptySpans[len(nonEmptySpans) // 2]]
+        self._irregularSpans = [span for span in nonEmptySpans
+                                if not np.allclose(self._spanPolynomials[span], self._regularPolynomial,
+                                                   rtol = 0, atol = 1e-12)]
+        self._uniformSpacing = spacing
+
+    def findSpans(self, parameters):
+        """Finds the spans of an array of parameter values. Gives the same answer as
+        findSpans(degree, parameters, knotVector)."""
+
+        parameters = np.asarray(parameters, dtype=float)
+        if self._uniformSpacing is None:
+            uniqueIndex = np.searchsorted(self._uniqueKnots, parameters, side='right') - 1
+            uniqueIndex = np.maximum(uniqueIndex, 0)
+        else:
+            # The distinct knots are evenly spaced, so the interval is found by division.
+            # Rounding can put a parameter sitting on a knot one interval out, which the
+            # two comparisons correct.
+            lastInterval = len(self._uniqueKnots) - 2
+            with np.errstate(invalid = 'ignore'):
+                uniqueIndex = np.floor((parameters - self._uniqueKnots[0]) / self._uniformSpacing)
+            uniqueIndex = np.clip(np.nan_to_num(uniqueIndex), 0, lastInterval).astype(int)
+            uniqueIndex += (parameters >= self._uniqueKnots[uniqueIndex + 1]) & (uniqueIndex < lastInterval)
+            uniqueIndex -= (parameters < self._uniqueKnots[uniqueIndex]) & (uniqueIndex > 0)
+
+        spans = self._uniqueKnotSpans[uniqueIndex]
+
+        spans = np.where(self.knotVector[0] > parameters, self.degree, spans)
+        spans = np.where(parameters >= self.knotVector[self.numSpans], self.numSpans - 1, spans)
+
+        return spans
+
+    def basisFunctions(self, parameters):
+        """Evaluates the non-zero basis functions at an array of parameter values.
+
+        Returns
+        -------
+        A tuple of (spans, values), as for bandedSplineBasisFunctions."""
+
+        parameters = np.asarray(parameters, dtype=float)
+        spans = self.findSpans(parameters)
+        if self._uniformSpacing is None:
+            values = splineBasisFunctionsAtParameters(spans, parameters, self.degree, self.knotVector,
+                                                      self._reciprocalKnotDifferences)
+        else:
+            values = self._uniformBasisFunctions(spans, parameters)
+        return spans, values
+
+    def _uniformBasisFunctions(self, spans, parameters):
+        """Evaluates the tabulated basis polynomials, using Horner's scheme in the local coordinate."""
+
+        t = (parameters - self.knotVector[spans - 1]) / self._uniformSpacing
+
+        values = _evaluatePolynomials(self._regularPolynomial, t)
+        for span in self._irregularSpans:
+            onSpan = spans == span
+            if np.any(onSpan):
+                values[:, onSpan] = _evaluatePolynomials(self._spanPolynomials[span], t[onSpan])
+
+        return values.T
+
+    def evaluate(self, parameters):
+        """Evaluates the points on the curve at an array of parameter values.
+
+        Returns
+        -------
+        An array of points. The first index corresponds to parameters, any further
+        indices to dimension."""
+
+        spans, values = self.basisFunctions(parameters)
+        return evaluateBandedBasis(spans, values, self.controlPoints)
+
+    def derivatives(self, parameters, nDerivs):
+        """Evaluates the curve and its derivatives with respect to the parameter.
+
+        Returns
+        -------
+        An array where the first index corresponds to parameters, the second to
+        derivative order (0 being the points themselves), and any further indices
+        to dimension."""
+
+        spans, basisDerivatives = splineBasisDerivatives(parameters, self.degree,
+                                                         self.knotVector, nDerivs)
+        return np.stack([evaluateBandedBasis(spans, basisDerivatives[:, k, :], self.controlPoints)
+                         for k in range(0, nDerivs + 1)], axis = 1)
+
+    def spanPolynomials(self):
+        """Returns the curve as one polynomial per non-empty knot span, in the local
+        coordinate t = (u - start) / width, which runs from 0 to 1 across the span.
+
+        Returns
+        -------
+        A tuple of (starts, widths, coefficients). starts and widths give the parameter
+        range of each span. coefficients is an array where the first index corresponds
+        to span, the second to the power of t, and any further indices to dimension."""
+
+        spans = np.arange(self.degree, self.numSpans)
+        spans = spans[self.knotVector[spans - 1] < self.knotVector[spans]]
+        starts = self.knotVector[spans - 1]
+        widths = self.knotVector[spans] - starts
+
+        coefficients = np.empty((len(spans), self.degree) + self.controlPoints.shape[1:])
+        for i, (span, width) in enumerate(zip(spans, widths)):
+            basis = _spanBasisPolynomials(span, self.degree, self.knotVector, width)
+            coefficients[i] = np.tensordot(basis.T, self.controlPoints[span - self.degree:span], axes = 1)
+
+        return starts, widths, coefficients
+
+class NurbsCurve:
+    """A non-uniform rational B-spline curve, such as an exact circular arc.
+
+    The curve is held as a BSplineCurve in homogeneous coordinates, with control points
+    (w P, w), so evaluation is a single banded multiply-and-sum over every coordinate and
+    the weight together, followed by one array division by the weight.
+
+    Inputs
+    ------
+    degree: The degree of the curve. degree = polynomial order + 1.
+    knotVector: The knot vector. Expected that the values never decrease.
+    controlPoints : The control points. The first index corresponds to basis function
+                    index, the second to dimension.
+    weights : The weight of each control point. Must be positive."""
+
+    __slots__ = ('degree', 'knotVector', 'controlPoints', 'weights', 'homogeneousCurve')
+
+    def __init__(self, degree, knotVector, controlPoints, weights):
+        self.controlPoints = np.ascontiguousarray(controlPoints, dtype=np.float64)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+
+        if self.weights.shape != (len(self.controlPoints),):
+            raise ValueError("Expected one weight for each of the {} control points, got shape {}"
+                             .format(len(self.controlPoints), self.weights.shape))
+        if np.any(self.weights <= 0):
+            raise ValueError("NURBS weights must be positive")
+
+        homogeneousPoints = np.column_stack((self.controlPoints * self.weights[:, np.newaxis], self.weights))
+        self.homogeneousCurve = BSplineCurve(degree, knotVector, homogeneousPoints)
+        self.degree = degree
+        self.knotVector = self.homogeneousCurve.knotVector
+
+    def evaluate(self, parameters):
+        """Evaluates the points on the curve at an array of parameter values.
+
+        Returns
+        -------
+        An array of points. The first index corresponds to parameters, the second
+        to dimension."""
+
+        homogeneous = self.homogeneousCurve.evaluate(parameters)
+        return homogeneous[:, :-1] / homogeneous[:, -1:]
+
+    def derivatives(self, parameters, nDerivs):
+        """Evaluates the curve and its derivatives with respect to the parameter.
+
+        See the Nurbs book. This is a vectorised version of Algorithm A4.2, which
+        finds the rational derivatives from the derivatives of the homogeneous curve.
+
+        Returns
+        -------
+        An array where the first index corresponds to parameters, the second to
+        derivative order (0 being the points themselves), and the third to dimension."""
+
+        homogeneous = self.homogeneousCurve.derivatives(parameters, nDerivs)
+        weighted = homogeneous[:, :, :-1]
+        weights = homogeneous[:, :, -1:]
+
+        derivatives = np.empty_like(weighted)
+        reciprocalWeights = 1 / weights[:, 0]
+        for k in range(0, nDerivs + 1):
+            v = weighted[:, k].copy()
+            for i in range(1, k + 1):
+                v -= math.comb(k, i) * weights[:, i] * derivatives[:, k - i]
+            derivatives[:, k] = v * reciprocalWeights
+
+        return derivatives
+
+class BSplineSurface:
+    """A tensor product B-spline surface, e.g. a wing lofted through aerofoil sections.
+
+    Inputs
+    ------
+    degreeU, degreeV : The degree in each parametric direction. degree = polynomial order + 1.
+    knotVectorU, knotVectorV : The knot vector in each parametric direction.
+    controlPoints : The control net. The first index corresponds to the u basis function,
+                    the second to the v basis function, and the third to dimension."""
+
+    __slots__ = ('degreeU', 'knotVectorU', 'degreeV', 'knotVectorV', 'controlPoints')
+
+    def __init__(self, degreeU, knotVectorU, degreeV, knotVectorV, controlPoints):
+        self.degreeU = degreeU
+        self.knotVectorU = np.ascontiguousarray(knotVectorU, dtype=np.float64)
+        self.degreeV = degreeV
+        self.knotVectorV = np.ascontiguousarray(knotVectorV, dtype=np.float64)
+        self.controlPoints = np.ascontiguousarray(controlPoints, dtype=np.float64)
+
+        expectedShape = (len(self.knotVectorU) - degreeU, len(self.knotVectorV) - degreeV)
+        if self.controlPoints.ndim != 3 or self.controlPoints.shape[:2] != expectedShape:
+            raise ValueError("Expected a control net of shape {} + (dimension,), got {}"
+                             .format(expectedShape, self.controlPoints.shape))
+
+    def evaluateGrid(self, uParameters, vParameters):
+        """Evaluates the surface at every combination of the given u and v parameters.
+
+        The basis functions are built once for each direction, and then contracted
+        against the control net with two matrix products.
+
+        Returns
+        -------
+        An array of points. The first index corresponds to u parameters, the second to
+        v parameters, and the third to dimension."""
+
+        uBasis = splineBasisFunctions(uParameters, self.degreeU, self.knotVectorU)
+        vBasis = splineBasisFunctions(vParameters, self.degreeV, self.knotVectorV)
+
+        # (u params, u basis) x (u basis, v basis, dim), then contract the v basis
+        alongV = np.tensordot(uBasis, self.controlPoints, axes = 1)
+        return np.einsum('jb,ibk->ijk', vBasis, alongV, optimize = True)
+
+    def evaluate(self, uParameters, vParameters):
+        """Evaluates the surface at pairs of (u, v) parameters.
+
+        Returns
+        -------
+        An array of points. The first index corresponds to parameter pairs, the second
+        to dimension."""
+
+        uSpans, uValues = bandedSplineBasisFunctions(uParameters, self.degreeU, self.knotVectorU)
+        vSpans, vValues = bandedSplineBasisFunctions(vParameters, self.degreeV, self.knotVectorV)
+
+        rows = uSpans[:, np.newaxis] - self.degreeU + np.arange(self.degreeU)
+        columns = vSpans[:, np.newaxis] - self.degreeV + np.arange(self.degreeV)
+        patches = self.controlPoints[rows[:, :, np.newaxis], columns[:, np.newaxis, :]]
+
+        return np.einsum('na,nb,nabk->nk', uValues, vValues, patches, optimize = True)
+
+def bandedRationalBasisFunctions(parameters, degree, knotVector, weights):
+    """Evaluates the non-zero rational basis functions at a set of given parameters.
+
+    Inputs
+    ------
+    parameters : The parameter values to evaluate the basis functions at
+    degree: The degree of the curve
+    knotVector: The knot vector being operated on
+    weights : The weight of each basis function
+
+    Returns
+    -------
+    A tuple of (spans, values), laid out as for bandedSplineBasisFunctions. Each row of
+    values sums to one, and can be passed to evaluateBandedBasis with the unweighted
+    control points."""
+
+    weights = np.asarray(weights, dtype=float)
+    spans, values = bandedSplineBasisFunctions(parameters, degree, knotVector)
+
+    values = values * weights[spans[:, np.newaxis] - degree + np.arange(degree)]
+    values /= np.sum(values, axis = 1, keepdims = True)
+
+    return spans, values
+
+def _spanBasisPolynomials(span, degree, knotVector, spacing):
+    """Runs the basis function recurrence on polynomials rather than numbers, giving the
+    non-zero basis functions on a span as polynomials in t = (u - U(span-1)) / spacing.
+
+    Returns
+    -------
+    A 2d array. The first index corresponds to basis function, the second to the power of t."""
+
+    start = knotVector[span - 1]
+    basis = np.zeros([degree, degree])
+    basis[0, 0] = 1
+
+    for j in range(1, degree):
+        saved = np.zeros(degree)
+        for r in range(0, j):
+            # right(r+1) = U(span+r) - u and left(j-r) = u - U(span-j+r), both linear in t
+            temp = basis[r] / (knotVector[span + r] - knotVector[span - j + r])
+            right = _multiplyByLinear(temp, knotVector[span + r] - start, -spacing)
+            left = _multiplyByLinear(temp, start - knotVector[span - j + r], spacing)
+
+            basis[r] = saved + right
+            saved = left
+
+        basis[j] = saved
+
+    return basis
+
+def _multiplyByLinear(coefficients, constant, slope):
+    """Multiplies a polynomial, given by its coefficients in increasing powers, by
+    (constant + slope t). The top coefficient must be zero, so the result fits."""
+
+    product = constant * coefficients
+    product[1:] += slope * coefficients[:-1]
+    return product
+
+def _evaluatePolynomials(coefficients, t):
+    """Evaluates each row of coefficients (in increasing powers) at t using Horner's scheme.
+    Returns an array with one row per polynomial."""
+
+    values = np.empty([len(coefficients), len(t)])
+    for i, polynomial in enumerate(coefficients):
+        values[i] = polynomial[-1]
+        for coefficient in polynomial[-2::-1]:
+            values[i] *= t
+            values[i] += coefficient
+
+    return values
+
+def bandedSplineBasisFunctions(parameters, degree, knotVector):
+    """Evaluates the basis functions at a set of given parameters, returning only
+    the non-zero values.
+
+    Each row of the matrix returned by splineBasisFunctions has at most degree
+    non-zero entries, so for large numbers of parameters and basis functions
+    this compact form is much smaller. Use evaluateBandedBasis to multiply it
+    by a set of control points.
+
+    Inputs
+    ------
+    parameters : The parameter values to evaluate the basis functions at
+    degree: The degree of the curve
+    knotVector: The knot vector being operated on
+
+    Returns
+    -------
+    A tuple of (spans, values). spans is an integer array with the span of each
+    parameter. values is a 2d array, with the first index corresponding to parameters
+    and the second to the non-zero basis functions spans[i] - degree to spans[i] - 1."""
+
+    spans = findSpans(degree, parameters, knotVector)
+    values = splineBasisFunctionsAtParameters(spans, parameters, degree, knotVector)
+
+    return spans, values
+
+def splineBasisDerivatives(parameters, degree, knotVector, nDerivs):
+    """Evaluates the non-zero basis functions, and their derivatives, at a set of
+    given parameters.
+
+    See the Nurbs book. This is a vectorised version of Algorithm A2.3, where every
+    step operates on all the parameters together.
+
+    Inputs
+    ------
+    parameters : The parameter values to evaluate the basis functions at
+    degree: The degree of the curve
+    knotVector: The knot vector being operated on
+    nDerivs : The highest derivative to calculate. Derivatives higher than the
+              polynomial order are all zero.
+
+    Returns
+    -------
+    A tuple of (spans, derivatives). spans is an integer array with the span of each
+    parameter. derivatives is a 3d array. The first index corresponds to parameters,
+    the second to derivative order (so [:, 0, :] are the basis functions themselves),
+    and the third to the non-zero basis functions spans[i] - degree to spans[i] - 1."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    parameters = np.asarray(parameters, dtype=float)
+    spans = findSpans(degree, parameters, knotVector)
+    numParameters = len(parameters)
+    order = degree - 1
+
+    # ndu holds the basis functions in its upper triangle, and the knot differences
+    # in its lower triangle, exactly as in A2.3. As in splineBasisFunctionsAtParameters,
+    # the parameter is the last index of the working arrays.
+    ndu = np.zeros([degree, degree, numParameters])
+    left = np.zeros([degree, numParameters])
+    right = np.zeros([degree, numParameters])
+    ndu[0, 0] = 1
+
+    for j in range(1, degree):
+        left[j] = parameters - knotVector[spans - j]
+        right[j] = knotVector[spans - 1 + j] - parameters
+        saved = np.zeros(numParameters)
+        for r in range(0, j):
+            ndu[j, r] = right[r+1] + left[j-r]
+            temp = ndu[r, j-1] / ndu[j, r]
+
+            ndu[r, j] = saved + right[r+1]*temp
+            saved = left[j-r] * temp
+
+        ndu[j, j] = saved
+
+    derivatives = np.zeros([nDerivs + 1, degree, numParameters])
+    derivatives[0] = ndu[:, order]
+
+    maxDeriv = min(nDerivs, order)
+    a = np.zeros([2, degree, numParameters])
+    for r in range(0, degree):
+        s1 = 0
+        s2 = 1
+        a[0, 0] = 1
+        for k in range(1, maxDeriv + 1):
+            d = np.zeros(numParameters)
+            rk = r - k
+            pk = order - k
+            if r >= k:
+                a[s2, 0] = a[s1, 0] / ndu[pk+1, rk]
+                d = a[s2, 0] * ndu[rk, pk]
+
+            j1 = 1 if rk >= -1 else -rk
+            j2 = k - 1 if r - 1 <= pk else order - r
+            for j in range(j1, j2 + 1):
+                a[s2, j] = (a[s1, j] - a[s1, j-1]) / ndu[pk+1, rk+j]
+                d = d + a[s2, j] * ndu[rk+j, pk]
+
+            if r <= pk:
+                a[s2, k] = -a[s1, k-1] / ndu[pk+1, r]
+                d = d + a[s2, k] * ndu[r, pk]
+
+            derivatives[k, r] = d
+            s1, s2 = s2, s1
+
+    factor = order
+    for k in range(1, maxDeriv + 1):
+        derivatives[k] *= factor
+        factor *= order - k
+
+    return spans, derivatives.transpose(2, 0, 1)
+
+class BasisCache:
+    """A least recently used cache of banded basis functions, for repeated evaluation at
+    the same parameters with the same knot vector, e.g. while only the control points change
+    in an optimisation loop.
+
+    The arrays handed out are read only, so cached results can safely be shared.
+
+    Inputs
+    ------
+    maxBytes : The memory budget for the cached arrays. When it is exceeded, the least
+               recently used entries are evicted."""
+
+    def __init__(self, maxBytes = 256 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, parameters, degree, knotVector):
+        """Returns bandedSplineBasisFunctions(parameters, degree, knotVector), calculating it
+        only if it is not already cached."""
+
+        parameters = np.ascontiguousarray(parameters, dtype=float)
+        knotVector = np.ascontiguousarray(knotVector, dtype=float)
+        key = (degree,
+               hashlib.sha1(knotVector.tobytes()).hexdigest(),
+               parameters.shape,
+               hashlib.sha1(parameters.tobytes()).hexdigest())
+
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        spans, values = bandedSplineBasisFunctions(parameters, degree, knotVector)
+        values = np.ascontiguousarray(values)
+        spans.setflags(write = False)
+        values.setflags(write = False)
+
+        self._entries[key] = (spans, values)
+        self.bytes += spans.nbytes + values.nbytes
+        while self.bytes > self.maxBytes and len(self._entries) > 1:
+            _, (evictedSpans, evictedValues) = self._entries.popitem(last = False)
+            self.bytes -= evictedSpans.nbytes + evictedValues.nbytes
+
+        return spans, values
+
+    def evaluate(self, parameters, degree, knotVector, controlPoints):
+        """Evaluates the curve with the given control points at the parameters, using
+        the cached basis functions."""
+
+        spans, values = self.get(parameters, degree, knotVector)
+        return evaluateBandedBasis(spans, values, controlPoints)
+
+    def clear(self):
+        """Removes all the cached basis functions and resets the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def statistics(self):
+        """Returns a dictionary of the hits, misses, number of entries, and memory used
+        and allowed by the cache."""
+        return { 'hits' : self.hits,
+                 'misses' : self.misses,
+                 'size' : len(self._entries),
+                 'bytes' : self.bytes,
+                 'maxBytes' : self.maxBytes }
+
+def evaluateBandedBasis(spans, values, controlPoints):
+    """Multiplies a banded set of basis functions by a set of control points.
+
+    This gives the same answer as splineBasisFunctions(p, d, k) * controlPoints,
+    without ever building the dense basis matrix.
+
+    Inputs
+    ------
+    spans : The spans, as returned by bandedSplineBasisFunctions
+    values : The non-zero basis function values, as returned by bandedSplineBasisFunctions
+    controlPoints : The control points. The first index corresponds to basis function
+                    index, any further indices to dimension.
+
+    Returns
+    -------
+    An array of points. The first index corresponds to parameters, any further indices
+    are the same as for the control points."""
+
+    controlPoints = np.asarray(controlPoints, dtype=float)
+    degree = values.shape[1]
+
+    # Work one coordinate at a time, as gathering from a contiguous row of coordinates
+    # is much faster than gathering whole control points.
+    coordinates = np.ascontiguousarray(controlPoints.reshape(len(controlPoints), -1).T)
+    points = np.zeros([len(coordinates), len(spans)])
+    for k in range(0, degree):
+        columns = spans - degree + k
+        for coordinate in range(0, len(coordinates)):
+            points[coordinate] += values[:, k] * coordinates[coordinate].take(columns)
+
+    return points.T.reshape((len(spans),) + controlPoints.shape[1:])
+
+@instrumented('splineBasisFunctionsAtParameters', lambda spans, parameters, *args, **kwargs: np.size(parameters))
+def splineBasisFunctionsAtParameters(spans, parameters, degree, knotVector,
+                                     reciprocalKnotDifferences = None):
+    """Evaluates the non-zero spline basis functions at a whole array of parameter
+    values at once.
+
+    This runs the same recurrence as splineBasisFunctionsAtSingleParameter, but
+    each step operates on every parameter together, so the only python level
+    loops are over the degree.
+
+    Inputs
+    ------
+    spans : An integer array of the span of each parameter value, as returned by findSpans
+    parameters : The parameter values to evaluate the basis functions at
+    degree: The degree of the curve
+    knotVector: The knot vector being operated on
+    reciprocalKnotDifferences : Optional. A 2d array where element [j, i] holds
+                                1 / (U(i+j) - U(i)), as precomputed by BSplineCurve.
+                                If given, the recurrence multiplies by these instead
+                                of dividing.
+
+    Returns
+    -------
+    A 2d array. The first index corresponds to parameters. The second index corresponds
+    to the non-zero basis functions, so row i holds the basis functions
+    spans[i] - degree to spans[i] - 1."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    parameters = np.asarray(parameters, dtype=float)
+    spans = np.asarray(spans)
+    numParameters = len(parameters)
+
+    # The working arrays have the parameter as their last index, so that each step
+    # of the recurrence works on contiguous rows. The result is transposed at the end.
+    basis = np.zeros([degree, numParameters])
+    left = np.zeros([degree, numParameters])
+    right = np.zeros([degree, numParameters])
+    basis[0] = 1
+
+    for j in range(1, degree):
+        left[j] = parameters - knotVector[spans - j]
+        right[j] = knotVector[spans - 1 + j] - parameters
+        saved = np.zeros(numParameters)
+        for r in range(0, j):
+            if reciprocalKnotDifferences is None:
+                temp = basis[r] / (right[r+1] + left[j-r])
+            else:
+                temp = basis[r] * reciprocalKnotDifferences[j, spans - j + r]
+
+            basis[r] = saved + right[r+1]*temp
+            saved = left[j-r] * temp
+
+        basis[j] = saved
+
+    return basis.T
     
+@instrumented('splineBasisFunctionsAtSingleParameter')
 def splineBasisFunctionsAtSingleParameter(span, u, degree, knotVector):
     """Evaluates the full set of non-zero spline basis functions at a given parmeter
     value.
@@ -129,3 +845,177 @@ def splineBasisFunctionsAtSingleParameter(span, u, degree, knotVector):
         basis[j] = saved
 
     return basis
+
+def insertKnot(degree, knotVector, controlPoints, u, times = 1):
+    """Inserts a knot into a curve, without changing the shape of the curve.
+
+    See the Nurbs book. This is Algorithm A5.1 (Boehm's algorithm), with each step
+    applied to all the affected control points at once.
+
+    Inputs
+    ------
+    degree: The degree of the curve. degree = polynomial order + 1.
+    knotVector: The knot vector of the curve
+    controlPoints : The control points of the curve. The first index corresponds to
+                    basis function index, any further indices to dimension.
+    u : The knot to insert. This must be strictly inside the range of the curve.
+    times : The number of times to insert the knot. The final multiplicity of the knot
+            cannot exceed the polynomial order.
+
+    Returns
+    -------
+    A tuple of (knotVector, controlPoints) for the refined curve."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    controlPoints = np.asarray(controlPoints, dtype=float)
+    order = degree - 1
+    numSpans = len(knotVector) - (degree - 1)
+
+    if not knotVector[degree - 1] < u < knotVector[numSpans]:
+        raise ValueError("Can only insert knots strictly inside the curve's range, got {}".format(u))
+
+    multiplicity = int(np.count_nonzero(knotVector == u))
+    if times + multiplicity > order:
+        raise ValueError("Inserting {} {} times would give it multiplicity above {}".format(u, times, order))
+
+    # k is the span as in the book, so U(k) <= u < U(k+1)
+    k = findSpan(degree, u, knotVector) - 1
+    numControlPoints = len(controlPoints)
+
+    newKnotVector = np.concatenate((knotVector[:k+1], np.full(times, u), knotVector[k+1:]))
+
+    newControlPoints = np.empty((numControlPoints + times,) + controlPoints.shape[1:])
+    newControlPoints[:k-order+1] = controlPoints[:k-order+1]
+    newControlPoints[k-multiplicity+times:] = controlPoints[k-multiplicity:]
+
+    affected = controlPoints[k-order:k-multiplicity+1].copy()
+    trailing = (1,) * (controlPoints.ndim - 1)
+    for j in range(1, times + 1):
+        first = k - order + j
+        i = np.arange(0, order - j - multiplicity + 1)
+        alpha = (u - knotVector[first + i]) / (knotVector[i + k + 1] - knotVector[first + i])
+        alpha = alpha.reshape((-1,) + trailing)
+        affected[i] = alpha * affected[i + 1] + (1 - alpha) * affected[i]
+
+        newControlPoints[first] = affected[0]
+        newControlPoints[k + times - j - multiplicity] = affected[order - j - multiplicity]
+
+    last = k - order + times
+    newControlPoints[last+1:k-multiplicity] = affected[1:k-multiplicity-last]
+
+    return newKnotVector, newControlPoints
+
+def refineKnotVector(degree, knotVector, controlPoints, newKnots):
+    """Inserts a set of knots into a curve at once, without changing the shape of the curve.
+
+    See the Nurbs book. This is Algorithm A5.4, with the update for each inserted knot
+    applied to all its control points at once, so each knot costs O(polynomial order).
+
+    Inputs
+    ------
+    degree: The degree of the curve. degree = polynomial order + 1.
+    knotVector: The knot vector of the curve
+    controlPoints : The control points of the curve. The first index corresponds to
+                    basis function index, any further indices to dimension.
+    newKnots : The knots to insert. These must be strictly inside the range of the curve,
+               and the final multiplicity of each knot cannot exceed the polynomial order.
+
+    Returns
+    -------
+    A tuple of (knotVector, controlPoints) for the refined curve."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    controlPoints = np.asarray(controlPoints, dtype=float)
+    newKnots = np.sort(np.asarray(newKnots, dtype=float))
+    if len(newKnots) == 0:
+        return knotVector.copy(), controlPoints.copy()
+
+    order = degree - 1
+    numSpans = len(knotVector) - (degree - 1)
+    if not knotVector[degree - 1] < newKnots[0] <= newKnots[-1] < knotVector[numSpans]:
+        raise ValueError("Can only insert knots strictly inside the curve's range")
+
+    uniqueKnots, times = np.unique(newKnots, return_counts=True)
+    multiplicities = (times + np.searchsorted(knotVector, uniqueKnots, side='right')
+                      - np.searchsorted(knotVector, uniqueKnots, side='left'))
+    if np.any(multiplicities > order):
+        raise ValueError("Inserting {} would give knots with multiplicity above {}"
+                         .format(uniqueKnots[multiplicities > order], order))
+
+    m = len(knotVector) - 1
+    n = len(controlPoints) - 1
+    r = len(newKnots) - 1
+
+    # a and b are as in the book, so U(a) <= X(0) < U(a+1) and U(b-1) <= X(r) < U(b)
+    a = findSpan(degree, newKnots[0], knotVector) - 1
+    b = findSpan(degree, newKnots[r], knotVector)
+
+    newKnotVector = np.empty(m + r + 2)
+    newControlPoints = np.empty((n + r + 2,) + controlPoints.shape[1:])
+
+    newControlPoints[:a-order+1] = controlPoints[:a-order+1]
+    newControlPoints[b+r:] = controlPoints[b-1:]
+    newKnotVector[:a+1] = knotVector[:a+1]
+    newKnotVector[b+r+order+1:] = knotVector[b+order:]
+
+    trailing = (1,) * (controlPoints.ndim - 1)
+    l = np.arange(1, order + 1)
+    i = b + order - 1
+    k = b + order + r
+    for j in range(r, -1, -1):
+        while newKnots[j] <= knotVector[i] and i > a:
+            newControlPoints[k-order-1] = controlPoints[i-order-1]
+            newKnotVector[k] = knotVector[i]
+            k -= 1
+            i -= 1
+
+        newControlPoints[k-order-1] = newControlPoints[k-order]
+
+        # Each update reads two control points that no earlier update in this
+        # step has written, so all the updates can be made together.
+        index = k - order + l
+        alpha = newKnotVector[k + l] - newKnots[j]
+        zero = alpha == 0
+        alpha = np.where(zero, 0, alpha / np.where(zero, 1, newKnotVector[k + l] - knotVector[i - order + l]))
+        alpha = alpha.reshape((-1,) + trailing)
+        newControlPoints[index - 1] = alpha * newControlPoints[index - 1] + (1 - alpha) * newControlPoints[index]
+
+        newKnotVector[k] = newKnots[j]
+        k -= 1
+
+    return newKnotVector, newControlPoints
+
+def decomposeToBezier(degree, knotVector, controlPoints):
+    """Splits a curve into its Bezier segments, one per non-empty knot span.
+
+    Inputs
+    ------
+    degree: The degree of the curve. degree = polynomial order + 1.
+    knotVector: The knot vector of the curve. Expected to be clamped, i.e. to start
+                and end with degree equal knots.
+    controlPoints : The control points of the curve. The first index corresponds to
+                    basis function index, any further indices to dimension.
+
+    Returns
+    -------
+    An array where the first index corresponds to segment, the second to control point
+    within the segment, and any further indices to dimension. Each segment can be
+    evaluated with bernsteinFunctions over its own knot span."""
+
+    knotVector = np.asarray(knotVector, dtype=float)
+    order = degree - 1
+    numSpans = len(knotVector) - (degree - 1)
+
+    # Raise every internal knot to multiplicity order, then neighbouring segments
+    # share their end control points.
+    internalKnots, multiplicities = np.unique(knotVector[degree:numSpans], return_counts=True)
+    internalKnots = internalKnots[internalKnots < knotVector[numSpans]]
+    multiplicities = multiplicities[:len(internalKnots)]
+    newKnots = np.repeat(internalKnots, np.maximum(order - multiplicities, 0))
+
+    _, refinedControlPoints = refineKnotVector(degree, knotVector, controlPoints, newKnots)
+
+    numSegments = len(internalKnots) + 1
+    segmentStarts = np.arange(0, numSegments) * order
+    return refinedControlPoints[segmentStarts[:, np.newaxis] + np.arange(0, degree)]
+
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+#
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+import numpy as np
+from SplineAlgorithms import BSplineCurve
+from SplineAlgorithms import bandedSplineBasisFunctions
+
+def fitSplineCurve(points, degree, numControlPoints, parametrisation = 'chordLength'):
+    """Fits a B-spline curve through a set of points in the least squares sense.
+
+    Inputs
+    ------
+    points : The points to fit. The first index corresponds to point number, and the
+             second to dimension, e.g. the 'anticlockwise' output of create4DigitNacaAerofoil.
+    degree : The degree of the curve. degree = polynomial order + 1.
+    numControlPoints : The number of control points of the fitted curve, between degree
+                       and the number of points. With as many control points as points,
+                       the curve interpolates them.
+    parametrisation : How to assign parameter values to the points. Either 'chordLength'
+                      or 'centripetal'.
+
+    Returns
+    -------
+    A dictionary with the following fields:
+       curve : The fitted BSplineCurve
+       parameters : The parameter value assigned to each point
+
+    Notes
+    -----
+    The normal equations are assembled directly in banded form from the non-zero basis
+    functions, and solved with a banded Cholesky factorisation, so the cost is
+    O(number of points * degree^2) rather than building the dense basis matrix.
+
+    Close to, but not at, as many control points as points, some control points only
+    have one or two points near them, and the normal equations become too badly
+    conditioned to solve. Then np.linalg.LinAlgError, a ValueError, is raised."""
+
+    points = np.asarray(points, dtype=float)
+
+    if numControlPoints < degree or numControlPoints > len(points):
+        raise ValueError("numControlPoints must be between the degree ({}) and the number of points ({}), got {}"
+                         .format(degree, len(points), numControlPoints))
+
+    parameters = createParameters(points, parametrisation)
+    knotVector = createFittingKnotVector(parameters, degree, numControlPoints)
+
+    spans, values = bandedSplineBasisFunctions(parameters, degree, knotVector)
+    normalMatrix, rightHandSide = _assembleBandedNormalEquations(spans, values, points, numControlPoints)
+    controlPoints = _solveBandedPositiveDefinite(normalMatrix, rightHandSide)
+
+    return { 'curve' : BSplineCurve(degree, knotVector, controlPoints),
+             'parameters' : parameters }
+
+class CurveProjector:
+    """Finds the closest points on a curve to many given points.
+
+    Everything that only depends on the curve is built once, when the projector is
+    created: the curve as a polynomial on each knot span, a table of coarse points along
+    the curve, and a bounding box around each span. Each projection then starts from
+    the nearest coarse points and refines the parameters with vectorised Newton
+    iterations.
+
+    Inputs
+    ------
+    curve : The BSplineCurve to project onto
+    samplesPerSpan : The number of coarse intervals in each non-empty knot span"""
+
+    def __init__(self, curve, samplesPerSpan = 8):
+        self.curve = curve
+        self._spanStarts, self._spanWidths, coefficients = curve.spanPolynomials()
+        self.parameterRange = (self._spanStarts[0], self._spanStarts[-1] + self._spanWidths[-1])
+        # Stored as dimension, power of t, span, so that each component is contiguous
+        self._coefficients = np.ascontiguousarray(np.transpose(coefficients, (2, 1, 0)))
+
+        # The coarse points are in increasing parameter order, samplesPerSpan from each
+        # span, then the end of the curve.
+        numSpans = len(self._spanStarts)
+        self._samplesPerSpan = samplesPerSpan
+        self._sampleSpans = np.append(np.repeat(np.arange(0, numSpans), samplesPerSpan), numSpans - 1)
+        fractions = np.append(np.tile(np.arange(0, samplesPerSpan) / samplesPerSpan, numSpans), 1)
+        self._sampleParameters = self._spanStarts[self._sampleSpans] + self._spanWidths[self._sampleSpans] * fractions
+        self._sampleComponents = self._evaluateSpans(self._sampleSpans, fractions, 0)[0]
+        self._samplePoints = np.ascontiguousarray(self._sampleComponents.T)
+        self._sampleNormsSquared = np.sum(self._samplePoints**2, axis = 1)
+
+        # Each span lies inside the bounding box of its Bezier control points, which
+        # are b_j = sum over i <= j of (j choose i) / (n choose i) a_i, for the power
+        # basis coefficients a_i of a polynomial of order n.
+        order = coefficients.shape[1] - 1
+        toBezier = np.array([[math.comb(j, i) / math.comb(order, i) if i <= j else 0
+                              for i in range(0, order + 1)] for j in range(0, order + 1)])
+        bezierPoints = np.einsum('ji,sid->sjd', toBezier, coefficients)
+        self._boxLows = np.min(bezierPoints, axis = 1)
+        self._boxHighs = np.max(bezierPoints, axis = 1)
+
+    def project(self, points, iterations = 10, tolerance = 1e-12, pointsPerCell = 256):
+        """Projects points onto the curve.
+
+        Inputs
+        ------
+        points : The points to project. The first index corresponds to point number, and the
+                 second to dimension.
+        iterations : The maximum number of Newton iterations
+        tolerance : A point's iterations stop once its parameter changes by no more than
+                    this, or the next change is predicted to be no more than this.
+        pointsPerCell : The average number of points in each cell of the grid used to
+                        find the nearest coarse points
+
+        Returns
+        -------
+        A tuple of (parameters, distances), giving the parameter of the closest point on
+        the curve to each point, and the distance to it.
+
+        Notes
+        -----
+        The distance to a point can have several local minima along the curve, such as
+        one on each surface of an aerofoil. Newton iterations are started from the nearest
+        coarse point, and then from the nearest coarse point in the next best local
+        minimum, wherever the bounding boxes show that one could be closer. So the
+        closest point is only missed where a third local minimum is closer still, or
+        where one is too narrow to show up between the coarse points."""
+
+        points = np.asarray(points, dtype=float)
+        components = np.ascontiguousarray(points.T)
+        # Points are worked on in the order of the grid cells they fall in, so that
+        # each cell's points are contiguous.
+        order, cellStarts, cellLows, cellHighs = self._sortIntoCells(components, pointsPerCell)
+        components = np.take(components, order, axis = 1)
+        nearest, second = self._nearestSamples(components, cellStarts, cellLows, cellHighs)
+        parameters, distancesSquared = self._refine(components, nearest, iterations, tolerance)
+
+        # The other local minimum can only be closer if a span around it is.
+        others = np.flatnonzero(second >= 0)
+        otherComponents = np.take(components, others, axis = 1)
+        otherSpans = self._sampleSpans[second[others]]
+        bound = np.full(len(others), np.inf)
+        for offset in (-1, 0, 1):
+            spans = np.clip(otherSpans + offset, 0, len(self._spanStarts) - 1)
+            gaps = np.maximum(np.maximum(self._boxLows[spans].T - otherComponents,
+                                         otherComponents - self._boxHighs[spans].T), 0)
+            bound = np.minimum(bound, np.sum(gaps**2, axis = 0))
+        closeEnough = bound < distancesSquared[others]
+        others = others[closeEnough]
+
+        otherParameters, otherDistancesSquared = self._refine(otherComponents[:, closeEnough], second[others],
+                                                              iterations, tolerance)
+        closer = otherDistancesSquared < distancesSquared[others]
+        parameters[others[closer]] = otherParameters[closer]
+        distancesSquared[others[closer]] = otherDistancesSquared[closer]
+
+        projectedParameters = np.empty(len(points))
+        projectedParameters[order] = parameters
+        distances = np.empty(len(points))
+        distances[order] = np.sqrt(distancesSquared)
+        return projectedParameters, distances
+
+    def _refine(self, components, samples, iterations, tolerance, blockSize = 2**14):
+        """Runs the Newton iterations for points, given by component, from the coarse
+        points with the given indices. Returns the parameters and squared distances.
+
+        The points are refined in blocks, so that the intermediate arrays stay in cache."""
+
+        parameters = np.empty(len(samples))
+        distancesSquared = np.empty(len(samples))
+        for block in range(0, len(samples), blockSize):
+            rows = slice(block, block + blockSize)
+            parameters[rows], distancesSquared[rows] = self._refineBlock(components[:, rows], samples[rows],
+                                                                         iterations, tolerance)
+        return parameters, distancesSquared
+
+    def _refineBlock(self, components, samples, iterations, tolerance):
+        """Runs the Newton iterations for one block of points."""
+
+        parameters = self._startingParameters(components, samples)
+        distancesSquared = np.empty(len(parameters))
+
+        # Newton iterations on f(u) = C'(u).(C(u) - P), clamped to the curve's range. Where
+        # f'(u) isn't positive, the Gauss-Newton approximation |C'(u)|^2 is used instead.
+        # Newton converges quadratically, so the next change is about f'' / (2 f') times
+        # the square of this one, and points drop out once that is below the tolerance.
+        lower, upper = self.parameterRange
+        active = np.arange(0, len(parameters))
+        for iteration in range(0, iterations):
+            if len(active) == 0:
+                break
+
+            position, velocity, acceleration, jerk = self._evaluate(parameters[active], 3)
+            difference = position - components[:, active]
+            firstDerivative = np.sum(velocity * difference, axis = 0)
+            speedSquared = np.sum(velocity**2, axis = 0)
+            secondDerivative = speedSquared + np.sum(acceleration * difference, axis = 0)
+            thirdDerivative = 3 * np.sum(velocity * acceleration, axis = 0) + np.sum(jerk * difference, axis = 0)
+            positiveSecondDerivative = np.where(secondDerivative > 0, secondDerivative, speedSquared)
+
+            step = np.divide(firstDerivative, positiveSecondDerivative,
+                             out = np.zeros(len(active)), where = positiveSecondDerivative > 0)
+            unclamped = parameters[active] - step
+            newParameters = np.clip(unclamped, lower, upper)
+            change = newParameters - parameters[active]
+            nextChange = np.divide(np.abs(thirdDerivative) * change**2, 2 * positiveSecondDerivative,
+                                   out = np.full(len(active), np.inf), where = positiveSecondDerivative > 0)
+            moving = (np.abs(change) > tolerance) & ((nextChange > tolerance) | (newParameters != unclamped))
+
+            # |C(u) - P|^2 at the new parameter, from its Taylor series, whose derivatives
+            # are 2f, 2f' and 2f''.
+            distancesSquared[active] = (np.sum(difference**2, axis = 0) +
+                                        change * (2 * firstDerivative + change * (secondDerivative + change * thirdDerivative / 3)))
+            parameters[active] = newParameters
+            active = active[moving]
+
+        return parameters, np.maximum(distancesSquared, 0)
+
+    def _startingParameters(self, components, samples):
+        """Returns the parameter at the vertex of the parabola through the squared
+        distances to each coarse point and its two neighbours."""
+
+        middles = np.clip(samples, 1, len(self._sampleParameters) - 2)
+        u0, u1, u2 = (self._sampleParameters[middles + offset] for offset in (-1, 0, 1))
+        g0, g1, g2 = (np.sum((np.take(self._sampleComponents, middles + offset, axis = 1) - components)**2, axis = 0)
+                      for offset in (-1, 0, 1))
+
+        numerator = (u1 - u0)**2 * (g1 - g2) - (u1 - u2)**2 * (g1 - g0)
+        denominator = 2 * ((u1 - u0) * (g1 - g2) - (u1 - u2) * (g1 - g0))
+        # The denominator is negative when the parabola opens upwards.
+        vertices = u1 - np.divide(numerator, denominator, out = u1 - self._sampleParameters[samples],
+                                  where = denominator < 0)
+        return np.clip(vertices, u0, u2)
+
+    def _sortIntoCells(self, components, pointsPerCell):
+        """Sorts points, given by component, into the cells of a grid over them.
+
+        Returns
+        -------
+        A tuple of (order, cellStarts, cellLows, cellHighs). order sorts the points by
+        cell, and the points of the i'th occupied cell are then those from cellStarts[i] up
+        to cellStarts[i + 1]. cellLows and cellHighs are the corners of each occupied cell,
+        with the first index corresponding to cell and the second to dimension."""
+
+        dimension, numPoints = components.shape
+        if numPoints == 0:
+            noCells = np.zeros((0, dimension))
+            return np.zeros(0, dtype = int), np.zeros(1, dtype = int), noCells, noCells
+
+        lowest = np.min(components, axis = 1)
+        cellsPerSide = max(1, int((numPoints / pointsPerCell) ** (1 / dimension)))
+        cellSize = (np.max(components, axis = 1) - lowest) / cellsPerSide
+        cellSize[cellSize == 0] = 1
+
+        cellIndices = np.minimum(((components - lowest[:, np.newaxis]) / cellSize[:, np.newaxis]).astype(int),
+                                 cellsPerSide - 1)
+        # The cell numbers are kept in the smallest integer type that holds them, as
+        # numpy sorts 8 and 16 bit integers with a radix sort.
+        cells = np.ravel_multi_index(tuple(cellIndices), (cellsPerSide,) * dimension)
+        cells = cells.astype(np.min_scalar_type(cellsPerSide**dimension - 1))
+        order = np.argsort(cells, kind = 'stable')
+        sortedCells = cells[order]
+        cellStarts = np.append(np.flatnonzero(np.append(True, sortedCells[1:] != sortedCells[:-1])), numPoints)
+
+        cellLows = lowest + np.array(np.unravel_index(sortedCells[cellStarts[:-1]], (cellsPerSide,) * dimension)).T * cellSize
+        return order, cellStarts, cellLows, cellLows + cellSize
+
+    def _nearestSamples(self, components, cellStarts, cellLows, cellHighs):
+        """Returns the indices of the nearest coarse point to each point, and of the
+        nearest coarse point in another local minimum of the distance along the curve,
+        or -1 where there isn't one. The points are given by component, sorted into the
+        cells given by _sortIntoCells.
+
+        For each cell, the coarse points of a span only need comparing if the span's
+        bounding box is closer to the cell than the furthest any point in the cell can be
+        from its nearest coarse point. So each point is only compared with the coarse
+        points of the few spans near it, and the nearest is the same as comparing it with
+        every coarse point. The other local minima are the coarse points that are no
+        further than the coarse points either side of them."""
+
+        # Squared distance from each cell to each span's box, and the furthest any
+        # point in each cell can be from its nearest coarse point.
+        gaps = np.maximum(np.maximum(self._boxLows - cellHighs[:, np.newaxis],
+                                     cellLows[:, np.newaxis] - self._boxHighs), 0)
+        boxDistances = np.sum(gaps**2, axis = 2)
+        furthest = np.empty(len(cellLows))
+        blockSize = max(1, 2**16 // len(self._samplePoints))
+        for block in range(0, len(cellLows), blockSize):
+            corners = np.maximum((self._samplePoints - cellLows[block:block + blockSize, np.newaxis])**2,
+                                 (self._samplePoints - cellHighs[block:block + blockSize, np.newaxis])**2)
+            furthest[block:block + blockSize] = np.min(np.sum(corners, axis = 2), axis = 1)
+        candidateSamples = (boxDistances <= furthest[:, np.newaxis])[:, self._sampleSpans]
+
+        nearest = np.empty(components.shape[1], dtype = int)
+        second = np.full(components.shape[1], -1)
+        for cell in range(0, len(cellLows)):
+            candidates = np.flatnonzero(candidateSamples[cell])
+            inCell = slice(cellStarts[cell], cellStarts[cell + 1])
+            # |p - s|^2 without the |p|^2 term, which doesn't change the nearest sample.
+            # The first index is the coarse point, and the second the point.
+            distances = np.dot(self._samplePoints[candidates], components[:, inCell])
+            distances *= -2
+            distances += self._sampleNormsSquared[candidates, np.newaxis]
+            columns = np.arange(0, distances.shape[1])
+            best = np.argmin(distances, axis = 0)
+            nearest[inCell] = candidates[best]
+
+            # Coarse points no further than the candidates either side of them, within
+            # a run of consecutive candidates, are at local minima.
+            breaks = (np.diff(candidates) != 1)[:, np.newaxis]
+            rising = distances[1:] > distances[:-1]
+            minima = np.ones(distances.shape, dtype = bool)
+            minima[:-1] = rising | breaks
+            minima[1:] &= ~rising | breaks
+            minima[best, columns] = False
+            otherDistances = np.where(minima, distances, np.inf)
+            others = np.argmin(otherDistances, axis = 0)
+            found = np.flatnonzero(otherDistances[others, columns] < np.inf)
+            second[cellStarts[cell] + found] = candidates[others[found]]
+
+        return nearest, second
+
+    def _evaluate(self, parameters, nDerivs):
+        """Evaluates the curve, and its first nDerivs derivatives, from the span
+        polynomials. Each result is indexed by dimension, then parameter."""
+
+        spans = np.searchsorted(self._spanStarts, parameters, side = 'right') - 1
+        spans = np.clip(spans, 0, len(self._spanStarts) - 1)
+        fractions = (parameters - self._spanStarts[spans]) / self._spanWidths[spans]
+
+        results = self._evaluateSpans(spans, fractions, nDerivs)
+        for k in range(1, nDerivs + 1):
+            results[k] /= self._spanWidths[spans]**k
+        return results
+
+    def _evaluateSpans(self, spans, fractions, nDerivs):
+        """Evaluates the span polynomials, and their first nDerivs derivatives with
+        respect to the local coordinate, using Horner's scheme."""
+
+        coefficients = np.take(self._coefficients, spans, axis = 2)
+        t = fractions
+
+        # values[k] accumulates the k'th derivative divided by k!, which saves a
+        # multiplication on every step.
+        values = [coefficients[:, -1].copy()] + [np.zeros_like(coefficients[:, -1]) for k in range(0, nDerivs)]
+        for power in range(coefficients.shape[1] - 2, -1, -1):
+            for k in range(nDerivs, 0, -1):
+                values[k] *= t
+                values[k] += values[k - 1]
+            values[0] *= t
+            values[0] += coefficients[:, power]
+        for k in range(2, nDerivs + 1):
+            values[k] *= math.factorial(k)
+
+        return values
+
+def createParameters(points, parametrisation = 'chordLength'):
+    """Assigns a parameter value in [0, 1] to each of a sequence of points.
+
+    Inputs
+    ------
+    points : The points. The first index corresponds to point number, and the
+             second to dimension.
+    parametrisation : Either 'chordLength', where the parameter steps are proportional
+                      to the distance between points, or 'centripetal', where they are
+                      proportional to the square root of the distance.
+
+    Returns
+    -------
+    A 1d array of parameter values, starting at 0 and ending at 1."""
+
+    exponents = { 'chordLength' : 1.0, 'centripetal' : 0.5 }
+    if parametrisation not in exponents:
+        raise ValueError("Unknown parametrisation '{}', expected one of {}"
+                         .format(parametrisation, sorted(exponents)))
+
+    points = np.asarray(points, dtype=float)
+    distances = np.sqrt(np.sum(np.diff(points, axis = 0)**2, axis = 1))
+    steps = np.power(distances, exponents[parametrisation])
+
+    parameters = np.zeros(len(points))
+    np.cumsum(steps, out = parameters[1:])
+    parameters /= parameters[-1]
+
+    return parameters
+
+def createFittingKnotVector(parameters, degree, numControlPoints):
+    """Creates a clamped knot vector suitable for least squares fitting at the given
+    parameters, by averaging the parameter values (see eq. 9.68 and 9.69 of the Nurbs book).
+    This places the internal knots so that every span contains some parameters.
+
+    When there are as many control points as parameters, the curve interpolates, and the
+    knots are instead averages of order consecutive parameters (eq. 9.8 of the Nurbs book).
+
+    Inputs
+    ------
+    parameters : The increasing parameter values, starting at 0 and ending at 1
+    degree : The degree of the curve
+    numControlPoints : The number of control points the curve will have
+
+    Returns
+    -------
+    The knot vector, with degree zeros at the start and degree ones at the end."""
+
+    numInternalKnots = numControlPoints - degree
+    order = degree - 1
+
+    if numControlPoints == len(parameters) and order > 0:
+        sums = np.concatenate(([0], np.cumsum(parameters)))
+        internalKnots = (sums[order + 1:numControlPoints] - sums[1:numInternalKnots + 1]) / order
+        return np.concatenate((np.zeros(degree), internalKnots, np.ones(degree)))
+
+    spacing = len(parameters) / (numInternalKnots + 1)
+
+    j = np.arange(1, numInternalKnots + 1)
+    i = (j * spacing).astype(int)
+    alpha = j * spacing - i
+    internalKnots = (1 - alpha) * parameters[i - 1] + alpha * parameters[i]
+
+    return np.concatenate((np.zeros(degree), internalKnots, np.ones(degree)))
+
+def _assembleBandedNormalEquations(spans, values, points, numBasis):
+    """Assembles N^T N and N^T P, where N is the basis matrix given in banded form.
+
+    Returns
+    -------
+    A tuple of (normalMatrix, rightHandSide). normalMatrix is in lower banded form,
+    so normalMatrix[d, j] holds element (j + d, j)."""
+
+    degree = values.shape[1]
+    columns = spans[:, np.newaxis] - degree + np.arange(degree)
+
+    normalMatrix = np.zeros([degree, numBasis])
+    for a in range(0, degree):
+        for b in range(0, a + 1):
+            normalMatrix[a - b] += np.bincount(columns[:, b], weights = values[:, a] * values[:, b],
+                                               minlength = numBasis)
+
+    rightHandSide = np.zeros([numBasis, points.shape[1]])
+    for a in range(0, degree):
+        for dimension in range(0, points.shape[1]):
+            rightHandSide[:, dimension] += np.bincount(columns[:, a],
+                                                       weights = values[:, a] * points[:, dimension],
+                                                       minlength = numBasis)
+
+    return normalMatrix, rightHandSide
+
+def _solveBandedPositiveDefinite(lowerBanded, rightHandSide, maxConditionNumber = 1e10):
+    """Solves A x = b for symmetric positive definite banded A using a Cholesky factorisation.
+
+    Inputs
+    ------
+    lowerBanded : A in lower banded form, so lowerBanded[d, j] is element (j + d, j).
+    rightHandSide : b, with the first index corresponding to the rows of A.
+    maxConditionNumber : The largest estimated condition number of A to accept
+
+    Returns
+    -------
+    x, the same shape as rightHandSide. Raises np.linalg.LinAlgError if A is not
+    numerically positive definite, or if its estimated condition number is above
+    maxConditionNumber.
+
+    Notes
+    -----
+    The condition number estimate is the larger of two. The square of the ratio of the
+    largest to smallest diagonal entries of the Cholesky factor is a lower bound on it.
+    The other bounds the largest eigenvalue by the largest absolute row sum, and
+    estimates the smallest by a few steps of inverse iteration with the factor."""
+
+    factor = lowerBanded.copy()
+    bandwidth, size = factor.shape
+
+    # Factorise in place, so factor holds L in the same banded layout.
+    for j in range(0, size):
+        if not factor[0, j] > 0:
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+        factor[0, j] = np.sqrt(factor[0, j])
+        below = min(bandwidth - 1, size - 1 - j)
+        factor[1:below+1, j] /= factor[0, j]
+        for d in range(1, below + 1):
+            factor[0:below-d+1, j+d] -= factor[d:below+1, j] * factor[d, j]
+
+    rowSums = np.sum(np.abs(lowerBanded), axis = 0)
+    for d in range(1, bandwidth):
+        rowSums[d:] += np.abs(lowerBanded[d, :size-d])
+
+    # The eigenvector of the smallest eigenvalue oscillates, so start from one that does.
+    vector = np.where(np.arange(0, size) % 2 == 0, 1.0, -1.0)[:, np.newaxis]
+    for iteration in range(0, 3):
+        vector /= np.linalg.norm(vector)
+        vector = _solveCholeskyFactored(factor, vector)
+
+    conditionNumber = max((np.max(factor[0]) / np.min(factor[0]))**2,
+                          np.max(rowSums) * np.linalg.norm(vector))
+    if conditionNumber > maxConditionNumber:
+        raise np.linalg.LinAlgError("Matrix is too close to singular, with estimated condition number {:.3g}"
+                                    .format(conditionNumber))
+
+    return _solveCholeskyFactored(factor, rightHandSide)
+
+def _solveCholeskyFactored(factor, rightHandSide):
+    """Solves L L^T x = b, given the Cholesky factor L in lower banded form, and returns
+    x as a new array."""
+
+    bandwidth, size = factor.shape
+    solution = np.array(rightHandSide, dtype=float)
+
+    # Forward substitution with L, then back substitution with L^T
+    for j in range(0, size):
+        below = min(bandwidth - 1, size - 1 - j)
+        solution[j] /= factor[0, j]
+        solution[j+1:j+below+1] -= np.outer(factor[1:below+1, j], solution[j])
+
+    for j in range(size - 1, -1, -1):
+        below = min(bandwidth - 1, size - 1 - j)
+        solution[j] -= np.dot(factor[1:below+1, j], solution[j+1:j+below+1])
+        solution[j] /= factor[0, j]
+
+    return solution
@@ -22,6 +22,9 @@ from WellBehavedPython.api import *
 from SplineAlgorithms import findSpan
 from SplineAlgorithms import splineBasisFunctions
 from SplineAlgorithms import splineBasisFunctionsAtSingleParameter
+from SplineAlgorithms import bandedSplineBasisFunctions
+from SplineAlgorithms import evaluateBandedBasis
+from SplineAlgorithms import BasisCache
 
 import numpy as np
 
@@ -134,6 +137,52 @@ class WithOneEvenlySpacedInternalKnot(TestCase):
 
         expect(basisValues).toEqual(expectedBasisValues)
 
+    def test_bandedSplineBasisFunctions_for_range_0_to_1_with_5_elements(self):
+        # When
+        parameters = np.linspace(0,1,5)
+        spans, values = bandedSplineBasisFunctions(parameters, self.degree, self.knotVector)
+
+        # Then
+        expectedSpans = np.array([2, 2, 3, 3, 3])
+        expectedValues = np.array([[1, 0],
+                                   [1/2, 1/2],
+                                   [1, 0],
+                                   [1/2, 1/2],
+                                   [0, 1]])
+        expect(spans).toEqual(expectedSpans)
+        expect(values).toEqual(expectedValues)
+
+    def test_evaluateBandedBasis_matches_dense_multiplication(self):
+        # Where
+        parameters = np.linspace(0,1,5)
+        controlPoints = np.array([[0, 0], [1, 2], [2, 0]])
+
+        # When
+        spans, values = bandedSplineBasisFunctions(parameters, self.degree, self.knotVector)
+        points = evaluateBandedBasis(spans, values, controlPoints)
+
+        # Then
+        expectedPoints = np.dot(splineBasisFunctions(parameters, self.degree, self.knotVector), 
+                                controlPoints)
+        expect(points).toBeCloseTo(expectedPoints)
+
+    def test_BasisCache_reuses_basis_functions_for_new_control_points(self):
+        # Where
+        cache = BasisCache()
+        parameters = np.linspace(0,1,5)
+        controlPoints = np.array([[0, 0], [1, 2], [2, 0]])
+
+        # When
+        cache.evaluate(parameters, self.degree, self.knotVector, controlPoints)
+        points = cache.evaluate(parameters.copy(), self.degree, self.knotVector, 2 * controlPoints)
+
+        # Then
+        expectedPoints = np.dot(splineBasisFunctions(parameters, self.degree, self.knotVector), 
+                                2 * controlPoints)
+        expect(points).toBeCloseTo(expectedPoints)
+        expect(cache.hits).toEqual(1)
+        expect(cache.misses).toEqual(1)
+
 class WithOneEvenlySpacedInternalDegenerateKnot(TestCase):
 
     def before(self):
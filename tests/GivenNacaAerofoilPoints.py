@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Copyright 2014 Iain Peddie iain.peddie@tessella.com
+# 
+#    This file is part of AgileAgorithmsCourse
+#
+#    WellBehavedPython is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    WellBehavedPython is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
+
+from WellBehavedPython.Engine.TestCase import TestCase
+from WellBehavedPython.api import *
+from NacaCurves import create4DigitNacaAerofoil
+from SplineAlgorithms import splineBasisFunctions
+from SplineFitting import fitSplineCurve
+from SplineFitting import createParameters
+from SplineFitting import CurveProjector
+from AerofoilStorage import writeAerofoil
+from AerofoilStorage import readAerofoil
+
+import numpy as np
+import os
+import tempfile
+
+class GivenNacaAerofoilPoints(TestCase):
+
+    def before(self):
+        theta = np.linspace(0, np.pi, 41)
+        x = (1-np.cos(theta))/2
+        self.aerofoil = create4DigitNacaAerofoil(4, 4, 12, x)
+        self.points = self.aerofoil['anticlockwise']
+
+    def test_that_chord_length_parameters_run_from_0_to_1(self):
+        # When
+        parameters = createParameters(self.points, 'chordLength')
+
+        # Then
+        expect(parameters[0]).toEqual(0)
+        expect(parameters[-1]).toEqual(1)
+        expect(bool(np.all(np.diff(parameters) > 0))).toEqual(True)
+
+    def test_that_fitted_control_points_match_dense_least_squares(self):
+        # Where
+        degree = 4
+        numControlPoints = 15
+
+        # When
+        fit = fitSplineCurve(self.points, degree, numControlPoints, 'centripetal')
+
+        # Then
+        curve = fit['curve']
+        basis = splineBasisFunctions(fit['parameters'], degree, curve.knotVector)
+        expectedControlPoints = np.linalg.lstsq(basis, self.points, rcond = None)[0]
+
+        expect(curve.controlPoints).toBeCloseTo(expectedControlPoints)
+
+    def test_that_fit_with_as_many_control_points_as_points_interpolates(self):
+        for degree in range(2, 6):
+            for parametrisation in ('chordLength', 'centripetal'):
+                # When
+                fit = fitSplineCurve(self.points, degree, len(self.points), parametrisation)
+
+                # Then
+                fittedPoints = fit['curve'].evaluate(fit['parameters'])
+                expect(fittedPoints).toBeCloseTo(self.points, absoluteTolerance = 1e-10)
+
+    def test_that_fit_with_three_quarters_as_many_control_points_as_points_matches_dense_least_squares(self):
+        # Where
+        numControlPoints = 3 * len(self.points) // 4
+
+        for degree in range(2, 6):
+            # When
+            fit = fitSplineCurve(self.points, degree, numControlPoints, 'centripetal')
+
+            # Then
+            curve = fit['curve']
+            basis = splineBasisFunctions(fit['parameters'], degree, curve.knotVector)
+            expectedControlPoints = np.linalg.lstsq(basis, self.points, rcond = None)[0]
+            expect(curve.controlPoints).toBeCloseTo(expectedControlPoints)
+
+    def test_that_fit_with_nearly_as_many_control_points_as_points_is_rejected(self):
+        for degree in range(2, 6):
+            expect(lambda: fitSplineCurve(self.points, degree, len(self.points) - 1)).toRaise(np.linalg.LinAlgError)
+
+    def test_that_points_on_fitted_curve_project_to_their_own_parameters(self):
+        # Where
+        curve = fitSplineCurve(self.points, 4, 15)['curve']
+        parameters = np.linspace(0.01, 0.99, 50)
+        pointsOnCurve = curve.evaluate(parameters)
+
+        # When
+        projectedParameters, distances = CurveProjector(curve).project(pointsOnCurve)
+
+        # Then
+        expect(projectedParameters).toBeCloseTo(parameters)
+        expect(distances).toBeCloseTo(np.zeros(50))
+
+    def test_that_projection_distances_bound_the_fit_error(self):
+        # Where
+        fit = fitSplineCurve(self.points, 4, 15)
+        curve = fit['curve']
+
+        # When
+        projectedParameters, distances = CurveProjector(curve).project(self.points)
+
+        # Then
+        fitDistances = np.sqrt(np.sum((curve.evaluate(fit['parameters']) - self.points)**2, axis = 1))
+        expect(bool(np.all(distances <= fitDistances + 1e-12))).toEqual(True)
+
+    def test_that_projecting_a_cloud_of_points_beats_a_dense_sampling_of_the_curve(self):
+        # Where
+        curve = fitSplineCurve(self.points, 4, 15)['curve']
+        cloud = np.random.default_rng(1).uniform((-0.1, -0.2), (1.1, 0.2), (2000, 2))
+        densePoints = curve.evaluate(np.linspace(0, 1, 2001))
+
+        # When
+        projectedParameters, distances = CurveProjector(curve).project(cloud, pointsPerCell = 16)
+
+        # Then
+        denseDistances = np.sqrt(np.min(np.sum((cloud[:, np.newaxis] - densePoints)**2, axis = 2), axis = 1))
+        expect(bool(np.all(distances <= denseDistances + 1e-12))).toEqual(True)
+        expect(distances).toBeCloseTo(np.sqrt(np.sum((curve.evaluate(projectedParameters) - cloud)**2, axis = 1)))
+
+    def test_that_points_nearest_a_second_local_minimum_project_to_it(self):
+        # Where
+        curve = fitSplineCurve(self.points, 4, 15)['curve']
+        # Near the trailing edge and inside the section, the nearest coarse points are on
+        # the other surface to the closest point.
+        points = np.array([[0.968, 0.004], [0.565, 0.0365]])
+        densePoints = curve.evaluate(np.linspace(0, 1, 20001))
+
+        # When
+        projectedParameters, distances = CurveProjector(curve).project(points)
+
+        # Then
+        denseDistances = np.sqrt(np.min(np.sum((points[:, np.newaxis] - densePoints)**2, axis = 2), axis = 1))
+        expect(bool(np.all(distances <= denseDistances + 1e-12))).toEqual(True)
+        expect(bool(projectedParameters[0] > 0.5)).toEqual(True)
+
+    def test_that_aerofoil_and_fitted_curve_round_trip_through_binary_file(self):
+        # Where
+        curve = fitSplineCurve(self.points, 4, 15)['curve']
+        fileDescriptor, fileName = tempfile.mkstemp()
+        os.close(fileDescriptor)
+
+        try:
+            # When
+            writeAerofoil(fileName, self.aerofoil, (4, 4, 12), 'cosine', curve)
+            stored = readAerofoil(fileName)
+
+            # Then
+            expect(stored['digits']).toEqual((4, 4, 12))
+            expect(stored['sampling']).toEqual('cosine')
+            expect(stored['degree']).toEqual(4)
+            expect(np.asarray(stored['knotVector'])).toEqual(curve.knotVector)
+            expect(np.asarray(stored['controlPoints'])).toEqual(curve.controlPoints)
+            expect(np.asarray(stored['upper'])).toEqual(self.aerofoil['upper'])
+            expect(np.asarray(stored['lower'])).toEqual(self.aerofoil['lower'])
+            expect(np.asarray(stored['anticlockwise'])).toEqual(self.points)
+        finally:
+            os.remove(fileName)
@@ -20,9 +20,20 @@
 from WellBehavedPython.Engine.TestCase import TestCase
 from WellBehavedPython.api import *
 from NacaCurves import create4DigitNacaAerofoil
+from NacaCurves import create4DigitNacaFamily
+from NacaCurves import AerofoilCache
+from NacaCurves import generate4DigitNacaAerofoilChunks
+from NacaCurves import adaptiveXValues
+from NacaSweep import runNacaSweep
+from Instrumentation import recording, reset, statistics
 from SplineAlgorithms import bernsteinFunctions
+from SplineAlgorithms import splineBasisFunctions
+from SplineFitting import fitSplineCurve
 
 import numpy as np
+import os
+import shutil
+import tempfile
 
 class GivenNothing(TestCase):
     def test_that_first_order_bernstein_polynomials_look_linear(self):
@@ -54,6 +65,19 @@ class GivenNothing(TestCase):
                                    [0, 0, 1]])
         expect(values).toEqual(expectedValues)
 
+    def test_that_bernstein_polynomials_match_spline_basis_with_clamped_knots(self):
+        # Where
+        parameters = np.linspace(-0.1, 1.1, 13)
+        degree = 5
+        knotVector = np.concatenate((np.zeros(degree), np.ones(degree)))
+
+        # When
+        values = bernsteinFunctions(parameters, degree)
+
+        # Then
+        expectedValues = splineBasisFunctions(parameters, degree, knotVector)
+        expect(values).toBeCloseTo(expectedValues)
+
     def test_that_00xx_naca_curve_is_symmetric(self):
         # Where
         x = np.linspace(0, 1, 11)
@@ -96,3 +120,197 @@ class GivenNothing(TestCase):
 
         # x_U and x_L get shifted by compensating amounts: x{U,L} = x \pm t sin\theta, so xU + xL = 2x
         expect((upperX+lowerX)/2).toBeCloseTo(x, absoluteTolerance = 1e-3)
+
+    def test_that_naca_curve_leaves_unsorted_x_values_untouched(self):
+        # Where
+        x = np.linspace(1, 0, 11)
+        originalX = x.copy()
+
+        # When
+        aerofoil = create4DigitNacaAerofoil(4, 4, 12, x)
+
+        # Then
+        expected = create4DigitNacaAerofoil(4, 4, 12, originalX[::-1], assumeSorted = True)
+        expect(x).toEqual(originalX)
+        expect(aerofoil['anticlockwise']).toEqual(expected['anticlockwise'])
+
+    def test_that_naca_curve_is_written_into_given_buffers(self):
+        # Where
+        x = np.linspace(0, 1, 11)
+        out = { 'upper' : np.zeros([11, 2]),
+                'anticlockwise' : np.zeros([21, 2]) }
+
+        # When
+        aerofoil = create4DigitNacaAerofoil(4, 4, 12, x, out = out)
+
+        # Then
+        expected = create4DigitNacaAerofoil(4, 4, 12, x.copy())
+        expect(aerofoil['upper'] is out['upper']).toEqual(True)
+        expect(aerofoil['anticlockwise'] is out['anticlockwise']).toEqual(True)
+        expect(out['upper']).toEqual(expected['upper'])
+        expect(out['anticlockwise']).toEqual(expected['anticlockwise'])
+
+    def test_that_naca_family_matches_individual_aerofoils(self):
+        # Where
+        x = np.linspace(0, 1, 11)
+        cambers = np.array([0, 4, 9])
+        positions = np.array([0, 4, 5])
+        thicknesses = np.array([12, 12, 16])
+
+        # When
+        family = create4DigitNacaFamily(cambers, positions, thicknesses, x)
+
+        # Then
+        for i in range(0, len(cambers)):
+            aerofoil = create4DigitNacaAerofoil(cambers[i], positions[i], thicknesses[i], x.copy())
+            expect(family['upper'][i]).toBeCloseTo(aerofoil['upper'])
+            expect(family['lower'][i]).toBeCloseTo(aerofoil['lower'])
+            expect(family['anticlockwise'][i]).toBeCloseTo(aerofoil['anticlockwise'])
+
+    def test_that_aerofoil_cache_returns_shared_read_only_results(self):
+        # Where
+        cache = AerofoilCache(maxSize = 1)
+        x = np.linspace(0, 1, 11)
+
+        # When
+        first = cache.get(4, 4, 12, x)
+        second = cache.get(4, 4, 12, x.copy())
+        cache.get(0, 0, 12, x)
+        third = cache.get(4, 4, 12, x)
+
+        # Then
+        expect(first['upper'] is second['upper']).toEqual(True)
+        expect(first['upper'] is third['upper']).toEqual(False)
+        expect(first['upper'].flags.writeable).toEqual(False)
+        expect(cache.statistics()).toEqual({ 'hits' : 1, 'misses' : 3, 'size' : 1, 'maxSize' : 1 })
+
+    def test_that_changing_a_cached_result_does_not_change_later_hits(self):
+        # Where
+        cache = AerofoilCache()
+        x = np.linspace(0, 1, 11)
+        first = cache.get(4, 4, 12, x)
+        expectedUpper = first['upper']
+
+        # When
+        first['upper'] = np.zeros([11, 2])
+        del first['lower']
+        second = cache.get(4, 4, 12, x)
+
+        # Then
+        expect(second['upper'] is expectedUpper).toEqual(True)
+        expect('lower' in second).toEqual(True)
+
+    def test_that_naca_chunks_join_up_to_the_anticlockwise_points(self):
+        # Where
+        theta = np.linspace(0, np.pi, 11)
+        x = (1 - np.cos(theta))/2
+
+        # When
+        chunks = list(generate4DigitNacaAerofoilChunks(4, 4, 12, x, chunkSize = 3))
+
+        # Then
+        expected = create4DigitNacaAerofoil(4, 4, 12, x)
+        expect(len(chunks[0]) <= 3).toEqual(True)
+        expect(np.concatenate(chunks)).toEqual(expected['anticlockwise'])
+
+    def test_that_adaptive_x_values_include_the_ends_and_camber_position(self):
+        # When
+        xValues = adaptiveXValues(4, 4, 12, tolerance = 1e-4)
+
+        # Then
+        expect(xValues[0]).toEqual(0.0)
+        expect(xValues[-1]).toEqual(1.0)
+        expect(bool(np.any(xValues == 0.4))).toEqual(True)
+        expect(bool(np.all(np.diff(xValues) > 0))).toEqual(True)
+
+    def test_that_adaptive_x_values_are_densest_at_the_leading_edge(self):
+        # When
+        xValues = adaptiveXValues(0, 0, 12, tolerance = 1e-5)
+
+        # Then
+        spacings = np.diff(xValues)
+        expect(int(np.argmin(spacings))).toEqual(0)
+        expect(bool(len(xValues) < 501)).toEqual(True)
+
+    def test_that_adaptive_x_values_stop_at_max_points(self):
+        # When
+        xValues = adaptiveXValues(4, 4, 12, tolerance = 1e-8, maxPoints = 50)
+
+        # Then
+        expect(len(xValues)).toEqual(50)
+
+    def test_that_adaptive_x_values_reject_max_points_below_the_starting_values(self):
+        expect(lambda: adaptiveXValues(4, 4, 12, maxPoints = 5)).toRaise(ValueError)
+        expect(lambda: adaptiveXValues(4, 4, 12, maxPoints = 9)).toRaise(ValueError)
+        expect(len(adaptiveXValues(4, 4, 12, maxPoints = 10))).toEqual(10)
+
+    def test_that_naca_sweep_matches_individual_aerofoils(self):
+        # Where
+        x = np.linspace(0, 1, 11)
+
+        # When
+        sweep = runNacaSweep(x, cambers = [0, 4], positions = [4], thicknesses = [12, 15],
+                             maxWorkers = 2, shardSize = 3)
+
+        # Then
+        expect(sweep['digits']).toEqual(np.array([[0, 4, 12], [0, 4, 15], [4, 4, 12], [4, 4, 15]]))
+        for i, (camber, position, thickness) in enumerate(sweep['digits']):
+            aerofoil = create4DigitNacaAerofoil(camber, position, thickness, x)
+            expect(sweep['anticlockwise'][i]).toBeCloseTo(aerofoil['anticlockwise'])
+
+    def test_that_naca_sweep_resumes_fitted_splines_from_checkpoint(self):
+        # Where
+        x = np.linspace(0, 1, 11)
+        arguments = dict(cambers = [0, 4], positions = [4], thicknesses = [12, 15, 18],
+                         degree = 3, numControlPoints = 8, maxWorkers = 2)
+        directory = tempfile.mkdtemp()
+        checkpointFile = os.path.join(directory, 'sweep.npz')
+
+        try:
+            sweep = runNacaSweep(x, shardSize = 2, checkpointFile = checkpointFile, **arguments)
+
+            # Forget the last shard, so only it is rerun
+            with np.load(checkpointFile) as checkpoint:
+                saved = { name : checkpoint[name] for name in checkpoint.files }
+            saved['done'][-1] = False
+            np.savez(checkpointFile, **saved)
+
+            # When
+            resumed = runNacaSweep(x, shardSize = 2, checkpointFile = checkpointFile, **arguments)
+
+            # Then
+            for name in ('anticlockwise', 'knotVectors', 'controlPoints'):
+                expect(resumed[name]).toEqual(sweep[name])
+            for i, points in enumerate(sweep['anticlockwise']):
+                curve = fitSplineCurve(points, 3, 8)['curve']
+                expect(sweep['controlPoints'][i]).toBeCloseTo(curve.controlPoints)
+            expect(lambda: runNacaSweep(x, shardSize = 3, checkpointFile = checkpointFile,
+                                        **arguments)).toRaise(ValueError)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_that_instrumentation_records_only_while_recording(self):
+        # Where
+        x = np.linspace(0, 1, 11)
+        reset()
+
+        # When
+        create4DigitNacaAerofoil(4, 4, 12, x)
+        with recording():
+            create4DigitNacaAerofoil(4, 4, 12, x)
+            create4DigitNacaAerofoil(0, 0, 12, x)
+
+        # Then
+        recorded = statistics()['create4DigitNacaAerofoil']
+        expect(recorded['calls']).toEqual(2)
+        expect(recorded['totalSize']).toEqual(22)
+        expect(recorded['maxSize']).toEqual(11)
+
+    def test_that_instrumented_functions_are_only_wrapped_while_recording(self):
+        # When
+        with recording():
+            wrappedWhileRecording = hasattr(create4DigitNacaAerofoil, '__wrapped__')
+
+        # Then
+        expect(wrappedWhileRecording).toEqual(True)
+        expect(hasattr(create4DigitNacaAerofoil, '__wrapped__')).toEqual(False)
@@ -20,8 +20,18 @@
 from WellBehavedPython.Engine.TestCase import TestCase
 from WellBehavedPython.api import *
 from SplineAlgorithms import findSpan
+from SplineAlgorithms import findSpans
 from SplineAlgorithms import splineBasisFunctions
 from SplineAlgorithms import splineBasisFunctionsAtSingleParameter
+from SplineAlgorithms import splineBasisFunctionsAtParameters
+from SplineAlgorithms import BSplineCurve
+from SplineAlgorithms import splineBasisDerivatives
+from SplineAlgorithms import insertKnot
+from SplineAlgorithms import refineKnotVector
+from SplineAlgorithms import decomposeToBezier
+from SplineAlgorithms import NurbsCurve
+from SplineAlgorithms import bandedRationalBasisFunctions
+from SplineAlgorithms import BSplineSurface
 
 import numpy as np
 
@@ -98,6 +108,77 @@ class WithNoInternalKnots(TestCase):
 
         expect(basisValues).toEqual(expectedBasisValues)    
 
+    def test_splineBasisDerivatives_at_0p5_are_bernstein_derivatives(self):
+        # When
+        parameters = np.array([0.5])
+        spans, derivatives = splineBasisDerivatives(parameters, self.degree, self.knotVector, 3)
+
+        # Then
+        # (1-u)^2, 2u(1-u), u^2
+        # -2(1-u), 2 - 4u, 2u
+        # 2, -4, 2
+        expectedDerivatives = np.array([[[1/4, 1/2, 1/4],
+                                         [-1, 0, 1],
+                                         [2, -4, 2],
+                                         [0, 0, 0]]])
+        expect(spans).toEqual(np.array([3]))
+        expect(derivatives).toBeCloseTo(expectedDerivatives)
+
+    def test_NurbsCurve_with_quarter_circle_weights_lies_on_unit_circle(self):
+        # Where
+        parameters = np.linspace(0,1,11)
+        controlPoints = np.array([[1, 0], [1, 1], [0, 1]])
+        curve = NurbsCurve(self.degree, self.knotVector, controlPoints, [1, np.sqrt(0.5), 1])
+
+        # When
+        derivatives = curve.derivatives(parameters, 1)
+
+        # Then
+        radii = np.sqrt(np.sum(derivatives[:, 0]**2, axis = 1))
+        radialVelocities = np.sum(derivatives[:, 0] * derivatives[:, 1], axis = 1)
+        expect(derivatives[:, 0]).toBeCloseTo(curve.evaluate(parameters))
+        expect(radii).toBeCloseTo(np.ones(11))
+        expect(radialVelocities).toBeCloseTo(np.zeros(11), absoluteTolerance = 1e-12)
+
+    def test_NurbsCurve_with_unit_weights_matches_BSplineCurve(self):
+        # Where
+        parameters = np.linspace(0,1,11)
+        controlPoints = np.array([[0, 0], [1, 2], [3, 1]])
+        curve = NurbsCurve(self.degree, self.knotVector, controlPoints, np.ones(3))
+
+        # When
+        derivatives = curve.derivatives(parameters, 2)
+
+        # Then
+        expectedDerivatives = BSplineCurve(self.degree, self.knotVector, controlPoints).derivatives(parameters, 2)
+        expect(derivatives).toBeCloseTo(expectedDerivatives)
+
+    def test_bandedRationalBasisFunctions_at_0p5_are_weighted_bernstein_polynomials(self):
+        # When
+        spans, values = bandedRationalBasisFunctions(np.array([0.5]), self.degree, self.knotVector, [1, 2, 1])
+
+        # Then
+        # (1/4, 2 * 1/2, 1/4) / 1.5
+        expect(spans).toEqual(np.array([3]))
+        expect(values).toBeCloseTo(np.array([[1/6, 2/3, 1/6]]))
+
+    def test_BSplineSurface_with_control_net_at_greville_points_reproduces_bilinear_surface(self):
+        # Where
+        grevillePoints = np.array([0, 0.5, 1])
+        u, v = np.meshgrid(grevillePoints, grevillePoints, indexing = 'ij')
+        controlPoints = np.stack((u, v, u * v), axis = 2)
+        surface = BSplineSurface(self.degree, self.knotVector, self.degree, self.knotVector, controlPoints)
+        uParameters = np.linspace(0, 1, 5)
+        vParameters = np.linspace(0, 1, 4)
+
+        # When
+        points = surface.evaluateGrid(uParameters, vParameters)
+
+        # Then
+        u, v = np.meshgrid(uParameters, vParameters, indexing = 'ij')
+        expect(points).toBeCloseTo(np.stack((u, v, u * v), axis = 2))
+        expect(surface.evaluate(u.ravel(), v.ravel())).toBeCloseTo(points.reshape(-1, 3))
+
     def test_splineBasisFunctions_for_range_0_to_1_with_3_elements(self):
         # When
         parameters = np.linspace(0,1,3)
@@ -209,6 +290,22 @@ class WithOneEvenlySpacedInternalKnot(TestCase):
 
         expect(basisValues).toEqual(expectedBasisValues)    
 
+    def test_splineBasisFunctionsAtParameters_matches_single_parameter_version(self):
+        # Where
+        parameters = np.array([0, 0.25, 0.5])
+        spans = np.array([3, 3, 3])
+
+        # When
+        basisValues = splineBasisFunctionsAtParameters(spans, parameters, self.degree, self.knotVector)
+
+        # Then
+        # (1-2u)^2 2u(2-3u) 2u^2
+        expectedBasisValues = np.array([[1, 0, 0],
+                                        [2/8, 5/8, 1/8],
+                                        [0, 1/2, 1/2]])
+
+        expect(basisValues).toEqual(expectedBasisValues)
+
     def test_splineBasisFunctions_for_range_0_to_1_with_5_elements(self):
         # When
         parameters = np.linspace(0,1,5)
@@ -224,6 +321,100 @@ class WithOneEvenlySpacedInternalKnot(TestCase):
                                         [0, 0, 0, 1]])
         expect(basisValues).toEqual(expectedBasisValues)
 
+    def test_BSplineCurve_evaluate_matches_basis_functions_times_control_points(self):
+        # Where
+        parameters = np.linspace(0,1,5)
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+        curve = BSplineCurve(self.degree, self.knotVector, controlPoints)
+
+        # When
+        points = curve.evaluate(parameters)
+
+        # Then
+        expectedPoints = np.dot(splineBasisFunctions(parameters, self.degree, self.knotVector), 
+                                controlPoints)
+        expect(points).toBeCloseTo(expectedPoints)
+
+    def test_BSplineCurve_on_uniform_knots_matches_general_basis_functions(self):
+        # Where
+        knotVector = (0, 0, 0, 0.25, 0.5, 0.75, 1, 1, 1)
+        parameters = np.array([-0.1, 0, 0.1, 0.25, 0.3, 0.5, 0.6, 0.75, 0.9, 1, 1.1])
+        curve = BSplineCurve(self.degree, knotVector, np.zeros([6, 2]))
+
+        # When
+        spans, values = curve.basisFunctions(parameters)
+
+        # Then
+        expectedSpans = findSpans(self.degree, parameters, knotVector)
+        expectedValues = splineBasisFunctionsAtParameters(expectedSpans, parameters, self.degree, knotVector)
+        expect(spans).toEqual(expectedSpans)
+        expect(values).toBeCloseTo(expectedValues)
+
+    def test_insertKnot_gives_the_same_curve(self):
+        # Where
+        parameters = np.linspace(0,1,9)
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+
+        # When
+        knotVector, newControlPoints = insertKnot(self.degree, self.knotVector, controlPoints, 0.25)
+
+        # Then
+        expect(knotVector).toEqual(np.array([0, 0, 0, 0.25, 0.5, 1, 1, 1]))
+        expect(np.dot(splineBasisFunctions(parameters, self.degree, knotVector), newControlPoints)).toBeCloseTo(
+            np.dot(splineBasisFunctions(parameters, self.degree, self.knotVector), controlPoints))
+
+    def test_refineKnotVector_gives_the_same_curve(self):
+        # Where
+        parameters = np.linspace(0,1,9)
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+
+        # When
+        knotVector, newControlPoints = refineKnotVector(self.degree, self.knotVector, controlPoints,
+                                                        [0.75, 0.25, 0.5])
+
+        # Then
+        expect(knotVector).toEqual(np.array([0, 0, 0, 0.25, 0.5, 0.5, 0.75, 1, 1, 1]))
+        expect(np.dot(splineBasisFunctions(parameters, self.degree, knotVector), newControlPoints)).toBeCloseTo(
+            np.dot(splineBasisFunctions(parameters, self.degree, self.knotVector), controlPoints))
+
+    def test_refineKnotVector_rejects_knots_at_the_ends_or_above_the_polynomial_order(self):
+        # Where
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+
+        # Then
+        for newKnots in ([0], [1], [0.5, 0.5], [0.25, 0.25, 0.25]):
+            expect(lambda: refineKnotVector(self.degree, self.knotVector, controlPoints,
+                                            newKnots)).toRaise(ValueError)
+
+    def test_decomposeToBezier_splits_at_internal_knot(self):
+        # Where
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+
+        # When
+        segments = decomposeToBezier(self.degree, self.knotVector, controlPoints)
+
+        # Then
+        expectedSegments = np.array([[[0, 0], [1, 1], [1.5, 0]],
+                                     [[1.5, 0], [2, -1], [3, 0]]])
+        expect(segments).toBeCloseTo(expectedSegments)
+
+    def test_BSplineCurve_spanPolynomials_reproduce_curve_on_each_span(self):
+        # Where
+        controlPoints = np.array([[0, 0], [1, 1], [2, -1], [3, 0]])
+        curve = BSplineCurve(self.degree, self.knotVector, controlPoints)
+        t = np.linspace(0, 1, 5)
+
+        # When
+        starts, widths, coefficients = curve.spanPolynomials()
+
+        # Then
+        expect(starts).toBeCloseTo(np.array([0, 0.5]))
+        expect(widths).toBeCloseTo(np.array([0.5, 0.5]))
+        powers = t[:, np.newaxis] ** np.arange(0, self.degree)
+        for span in range(0, 2):
+            expectedPoints = curve.evaluate(starts[span] + widths[span] * t)
+            expect(np.dot(powers, coefficients[span])).toBeCloseTo(expectedPoints)
+
 
     
 class WithOneEvenlySpacedInternalDegenerateKnot(TestCase):    
@@ -282,6 +473,16 @@ class WithOneEvenlySpacedInternalDegenerateKnot(TestCase):
         # Then
         expect(span).toEqual(5)
 
+    def test_findSpans_matches_findSpan_either_side_of_the_knots(self):
+        # Where
+        parameters = np.array([-1e-5, 0, 0.5-1e-5, 0.5+1e-5, 1-1e-5, 1, 1.0001])
+
+        # When
+        spans = findSpans(self.degree, parameters, self.knotVector)
+
+        # Then
+        expect(spans).toEqual(np.array([3, 3, 3, 5, 5, 5, 5]))
+
     def test_splineBasisFunctions_for_range_0_to_1_with_5_elements(self):
         # When
         parameters = np.linspace(0,1,5)
@@ -17,8 +17,18 @@
 #    You should have received a copy of the GNU General Public License
 #    along with AgileAlgorithmsCourse. If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
+import concurrent.futures
+import contextlib
+import fnmatch
+import importlib
+import io
+import os
 import sys
+import time
+import traceback
 
+from WellBehavedPython.Engine.TestCase import TestCase
 from WellBehavedPython.Engine.TestSuite import TestSuite
 from WellBehavedPython.Runners.VerboseConsoleTestRunner import VerboseConsoleTestRunner
 from WellBehavedPython.api import registerExpectationClass, discoverTests
@@ -26,46 +36,139 @@ from WellBehavedPython.Expectations.Numpy.ArrayExpectations import ArrayExpectat
 
 import numpy as np
 
-sys.path.append("../src")
+thisDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(thisDirectory)
+sys.path.append(os.path.join(thisDirectory, "..", "src"))
 
+testModules = ["GivenLinearKnotVector",
+               "GivenQuadraticKnotVector",
+               "GivenNothing",
+               "GivenNacaAerofoilPoints"]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Runs the AgileAlgorithmsCourse tests.")
+    parser.add_argument("-j", "--jobs", type = int, default = 1,
+                        help = "Number of worker processes to shard the test classes across.")
+    parser.add_argument("-k", "--filter", action = "append", default = [],
+                        help = "Only run tests whose Module.Class.test name matches this glob, "
+                               "or contains it. May be given more than once.")
+    parser.add_argument("--slowest", type = int, default = 10,
+                        help = "Number of slowest tests to report.")
+    arguments = parser.parse_args()
 
-def main(suite):
     try:
+        tests = discoverTestNames(arguments.filter)
+        shards = shardTests(tests, arguments.jobs)
 
-        registerExpectationClass(lambda actual: isinstance(actual, np.ndarray),
-                                 ArrayExpectations)
-                
-        suite = createSuite()
-        
-        buffer = True
+        start = time.perf_counter()
+        if arguments.jobs > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers = arguments.jobs) as executor:
+                outcomes = [outcome for shard in executor.map(runShard, shards) for outcome in shard]
+        else:
+            outcomes = [outcome for shard in shards for outcome in runShard(shard)]
+        elapsed = time.perf_counter() - start
 
-        runner = VerboseConsoleTestRunner(bufferOutput = buffer)
-        results = runner.run(suite)
+        failures = report(outcomes, elapsed, arguments.slowest)
 
         sys.__stdout__.flush()
         sys.__stderr__.flush()
 
-        exit(results.countFailures() + results.countErrors() > 0)
-    except Exception as ex:        
-    
+        exit(failures > 0)
+    except Exception as ex:
+
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
         traceback.print_exc(file = sys.stdout)
-        
-    
+        exit(1)
+
 def createSuite():
 
     suite = TestSuite("AgileAlgorithmsCourseTests")
-    nothingSuite = discoverTests("GivenNothing")
-    linearKnotSuite = discoverTests("GivenLinearKnotVector")
-    quadraticKnotSuite = discoverTests("GivenQuadraticKnotVector")
-
-    suite.add(linearKnotSuite)
-    suite.add(quadraticKnotSuite)
-    suite.add(nothingSuite)
-    
+    for moduleName in testModules:
+        suite.add(discoverTests(moduleName))
+
     return suite
 
-if __name__ == "__main__":
-    main(createSuite())
+def discoverTestNames(patterns):
+    """Returns (module name, class name, test name) for every test method of every TestCase
+    class in testModules, keeping only those matching one of patterns (all if there are none)."""
+
+    tests = []
+    for moduleName in testModules:
+        module = importlib.import_module(moduleName)
+        for className, testClass in sorted(vars(module).items()):
+            if not (isinstance(testClass, type) and issubclass(testClass, TestCase)
+                    and testClass.__module__ == moduleName):
+                continue
+
+            for testName in sorted(dir(testClass)):
+                fullName = ".".join((moduleName, className, testName))
+                if testName.startswith("test") and _matches(fullName, patterns):
+                    tests.append((moduleName, className, testName))
+
+    return tests
+
+def shardTests(tests, numShards):
+    """Splits the tests into at most numShards lists, keeping each TestCase class together
+    and balancing the number of tests in each list."""
+
+    byClass = {}
+    for test in tests:
+        byClass.setdefault(test[:2], []).append(test)
+
+    shards = [[] for i in range(0, max(numShards, 1))]
+    for classTests in sorted(byClass.values(), key = len, reverse = True):
+        min(shards, key = len).extend(classTests)
+
+    return [shard for shard in shards if shard]
+
+def runShard(tests):
+    """Runs each test on its own, returning (full name, seconds, passed, output) for each."""
+
+    registerExpectationClass(lambda actual: isinstance(actual, np.ndarray),
+                             ArrayExpectations)
 
+    outcomes = []
+    for moduleName, className, testName in tests:
+        case = getattr(importlib.import_module(moduleName), className)()
+        case.configureTest(testName)
+
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            results = VerboseConsoleTestRunner(bufferOutput = True).run(case)
+        seconds = time.perf_counter() - start
+
+        passed = results.countFailures() + results.countErrors() == 0
+        outcomes.append((".".join((moduleName, className, testName)), seconds, passed, output.getvalue()))
+
+    return outcomes
+
+def report(outcomes, elapsed, numSlowest):
+    """Prints the outcome of every test, the output of failing tests, and the slowest tests.
+    Returns the number of failures."""
+
+    failed = [outcome for outcome in outcomes if not outcome[2]]
+
+    for name, seconds, passed, output in outcomes:
+        print("{} {} ({:.3f}s)".format("pass" if passed else "FAIL", name, seconds))
+
+    for name, seconds, passed, output in failed:
+        print("\n==== {} ====".format(name))
+        print(output)
+
+    if numSlowest > 0:
+        print("\nSlowest tests:")
+        for name, seconds, passed, output in sorted(outcomes, key = lambda outcome: -outcome[1])[:numSlowest]:
+            print("  {:8.3f}s {}".format(seconds, name))
+
+    print("\nRan {} tests in {:.3f}s, {} failed".format(len(outcomes), elapsed, len(failed)))
+
+    return len(failed)
+
+def _matches(fullName, patterns):
+    return (not patterns
+            or any(fnmatch.fnmatch(fullName, pattern) or pattern in fullName for pattern in patterns))
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,5 @@
 echo "$0"
 thisdir=`dirname $0`
 PYTHONPATH=$PYTHONPATH:$thisdir/../src
-python3 $thisdir/runAllTests.py
+python3 $thisdir/runAllTests.py "$@"
 